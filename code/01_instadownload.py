@@ -1,35 +1,69 @@
 from PIL import Image
 import os
-from instaloader import Instaloader, Profile
+from instaloader import Instaloader, Profile, Post, RateController
 import lzma
 import json
+import sqlite3
 import shutil
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
 from datetime import datetime, timedelta
+import post_index
+from post_index import METADATA_DATABASE, FAILED_POST, FAILED_METADATA
+import instrumentation
+from instrumentation import metrics, progress
 
-def sort_files_by_extension(base_path):
+# PNG direkt als JPEG in den Zielordner schreiben (läuft in einem Worker-Prozess)
+def convert_png_to_jpg(source_path, target_path):
+    with Image.open(source_path) as png_image:
+        png_image.convert('RGB').save(target_path, 'JPEG')
+    os.remove(source_path)
+
+def sort_files_by_extension(base_path, workers=None):
+    """
+    Verteilt die Dateien aus raw in einem einzigen Durchlauf auf die Ordner jpg und xz.
+    PNG-Dateien werden parallel in JPEG umgewandelt und direkt am Zielort gespeichert.
+
+    """
+    raw_folder = os.path.join(base_path, "raw")
+    os.makedirs(os.path.join(base_path, "jpg"), exist_ok=True)
     os.makedirs(os.path.join(base_path, "xz"), exist_ok=True)
     file_types = ['jpg', 'xz']
-    for file_type in file_types:
-        type_folder = os.path.join(base_path, file_type)
-
-        for filename in os.listdir(os.path.join(base_path, "raw")):
-            if filename.endswith(f".{'png'}"):
-                print(f"Bilddatei im Format .png erkannt.")
-                png_image = Image.open(os.path.join(os.path.join(base_path, "raw"), filename))
-                png_image.convert('RGB').save(os.path.join(os.path.join(base_path, "raw"), filename), 'JPEG')
-                print(f"{filename} verschieben nach {os.path.join(type_folder, filename[:-4] + ".jpg")}")
-                os.rename(
-                    os.path.join(os.path.join(base_path, "raw"), filename),
-                    os.path.join(type_folder, filename[:-4] + ".jpg")
-                )
-            elif filename.endswith(f".{file_type}"):
-                print(f"{filename} verschieben nach {os.path.join(type_folder, filename)}")
-                os.rename(
-                    os.path.join(os.path.join(base_path, "raw"), filename),
-                    os.path.join(type_folder, filename)
-                )
-
-    shutil.rmtree(os.path.join(base_path, "raw"))
+    moved_jpgs = []
+    counts = {"jpg": 0, "xz": 0, "png": 0}
+    started = time.monotonic()
+
+    conversions = []
+    for entry in os.scandir(raw_folder):
+        filename = entry.name
+        extension = filename.rsplit(".", 1)[-1]
+        if extension == 'png':
+            target_name = filename[:-4] + ".jpg"
+            conversions.append((entry.path, os.path.join(base_path, "jpg", target_name)))
+            moved_jpgs.append(target_name)
+        elif extension in file_types:
+            os.replace(entry.path, os.path.join(base_path, extension, filename))
+            counts[extension] += 1
+            if extension == 'jpg':
+                moved_jpgs.append(filename)
+
+    if conversions:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            sources, targets = zip(*conversions)
+            for _ in executor.map(convert_png_to_jpg, sources, targets):
+                counts["png"] += 1
+
+    shutil.rmtree(raw_folder)
+
+    seconds = time.monotonic() - started
+    total = sum(counts.values())
+    metrics.add_time("sortieren", seconds)
+    metrics.count("dateien_sortiert", total)
+    print(f"{total} Dateien sortiert ({counts['jpg']} jpg, {counts['xz']} xz, {counts['png']} png umgewandelt) "
+          f"in {seconds:.2f} s ({total / seconds if seconds > 0 else 0:.1f} Dateien/s).")
+    return moved_jpgs
 
 # .xz Dateien zu entpacken
 def extract_xz_files(input_folder, output_folder):
@@ -40,8 +74,9 @@ def extract_xz_files(input_folder, output_folder):
 
             try:
                 # Datei entpacken
-                with lzma.open(input_path, "rt", encoding="utf-8") as compressed_file:
+                with metrics.timer("entpacken"), lzma.open(input_path, "rt", encoding="utf-8") as compressed_file:
                     json_content = compressed_file.read()
+                metrics.count("bytes_gelesen", os.path.getsize(input_path))
 
                 try:
                     json.loads(json_content)
@@ -52,35 +87,278 @@ def extract_xz_files(input_folder, output_folder):
                 # Entpackten Inhalt speichern
                 with open(output_path, "w", encoding="utf-8") as json_file:
                     json_file.write(json_content)
+                metrics.count("bytes_geschrieben", os.path.getsize(output_path))
 
-                print(f"{filename} erfolgreich entpackt nach {output_path}")
+                progress(f"{filename} erfolgreich entpackt nach {output_path}")
 
             except Exception as e:
                 print(f"Fehler beim Verarbeiten von {filename}: {e}")
     shutil.rmtree(input_folder)
 
-# letzte Bilddatum im Profil zu finden
-def get_last_image_datetime(profile_folder):
-    jpg_folder = os.path.join(profile_folder, "jpg")
-    last_datetime = None
+# .xz Dateien direkt in eine Metadaten-Datenbank pro Profil einlesen
+def ingest_xz_metadata(input_folder, database_path):
+    connection = sqlite3.connect(database_path)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS metadata ("
+        "post TEXT PRIMARY KEY, likes INTEGER, comments INTEGER, json TEXT)"
+    )
+
+    rows = []
+    for filename in os.listdir(input_folder):
+        if filename.endswith(".xz"):
+            input_path = os.path.join(input_folder, filename)
+            # Schlüssel ist der Zeitstempel-Name des Posts, z. B. 2024-01-01_10-00-00_UTC
+            post = filename[:-len(".json.xz")] if filename.endswith(".json.xz") else filename[:-3]
 
-    # das neueste Bild basierend auf Datum und Zeit im Dateinamen finden
-    for filename in os.listdir(jpg_folder):
-        if filename.endswith(".jpg"):
-            # Dateiname im Format JJJJ-MM-TT_HH-MM-SS.jpg erwartet
             try:
-                file_datetime = datetime.strptime(filename[:19], "%Y-%m-%d_%H-%M-%S")
-                if last_datetime is None or file_datetime > last_datetime:
-                    last_datetime = file_datetime
-            except ValueError:
+                with metrics.timer("metadaten_einlesen"), lzma.open(input_path, "rt", encoding="utf-8") as compressed_file:
+                    json_content = compressed_file.read()
+                    data = json.loads(json_content)
+                metrics.count("bytes_gelesen", os.path.getsize(input_path))
+            except (lzma.LZMAError, json.JSONDecodeError) as e:
+                print(f"Warnung: {filename} konnte nicht gelesen werden: {e}")
                 continue
 
-    return last_datetime
+            node = data.get('node', {})
+            likes = node.get('edge_media_preview_like', {}).get('count')
+            comments = node.get('comments')
+            rows.append((post, likes, comments, json_content))
+
+    # Alle Posts in einer Transaktion schreiben
+    with metrics.timer("datenbank_schreiben"), connection:
+        connection.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?)", rows)
+    connection.close()
+
+    print(f"{len(rows)} Metadaten-Einträge in {database_path} gespeichert.")
+
+# letzte Bilddatum im Profil zu finden
+def get_last_image_datetime(profile_folder):
+    # Abfrage auf dem Post-Index statt alle Dateinamen im jpg-Ordner zu lesen
+    return post_index.last_image_datetime(profile_folder)
+
+# Download mit Wiederholungen und exponentiell wachsender Wartezeit
+def with_retries(action, retries, backoff):
+    for attempt in range(retries + 1):
+        try:
+            return action()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            wait = backoff * 2 ** attempt
+            print(f"Fehler beim Download ({e}), neuer Versuch in {wait:.1f} s.")
+            time.sleep(wait)
+
+def download_posts_concurrently(posts, start_date, end_date, update_metadata, start_date_metadata,
+                                download_post, download_metadata, max_concurrency=4, retries=3, backoff=1.0, on_failure=None):
+    """
+    Durchläuft den Post-Feed genau einmal und verteilt Bild- und Metadaten-Downloads auf einen begrenzten Thread-Pool.
+    posts kann jede Folge von Objekten mit date_utc und is_video sein, z. B. local_post_source.LocalPostSource.
+    on_failure(post, action, error) wird für jeden Post aufgerufen, der auch nach allen Wiederholungen fehlschlägt.
+
+    """
+    oldest_date = min(start_date, start_date_metadata) if update_metadata else start_date
+
+    def select_downloads():
+        for post in posts:
+            post_datetime = post.date_utc
+            # Bilder im angegebenen Zeitraum, ältere Posts optional nur mit Metadaten
+            if start_date <= post_datetime <= end_date and not post.is_video:
+                yield download_post, post
+            elif update_metadata and start_date_metadata <= post_datetime < start_date:
+                yield download_metadata, post
+            elif post_datetime < oldest_date:
+                break
+
+    return run_downloads(select_downloads(), max_concurrency, retries, backoff, on_failure)
+
+def run_downloads(downloads, max_concurrency=4, retries=3, backoff=1.0, on_failure=None):
+    # downloads: Folge von (Aktion, Post); gibt die Anzahl der erfolgreichen Downloads zurück
+    # Feed nur so weit vorauslesen, wie Plätze im Pool frei sind
+    slots = threading.BoundedSemaphore(max_concurrency * 2)
+    futures = []
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        for action, post in downloads:
+            slots.acquire()
+            future = executor.submit(with_retries, partial(action, post), retries, backoff)
+            future.add_done_callback(lambda _: slots.release())
+            futures.append((future, action, post))
+
+    downloaded_posts = 0
+    for future, action, post in futures:
+        try:
+            future.result()
+            downloaded_posts += 1
+        except Exception as e:
+            print(f"Download endgültig fehlgeschlagen: {e}")
+            if on_failure is not None:
+                on_failure(post, action, e)
+    return downloaded_posts
+
+def retry_failed_posts(profile_folder, post_source, download_post, download_metadata, max_concurrency=4, retries=3,
+                       backoff=1.0, on_failure=None):
+    """
+    Lädt Posts erneut, die in früheren Läufen endgültig fehlgeschlagen sind. Sie liegen meist vor dem letzten Bild,
+    ab dem der Download fortgesetzt wird, und würden sonst nie nachgeholt. Gibt die Anzahl der erfolgreichen
+    Downloads und die Shortcodes der erneut versuchten Posts zurück.
+
+    """
+    downloads = []
+    for shortcode, kind in post_index.failed_posts(profile_folder):
+        try:
+            post = post_source.get_post(shortcode)
+        except Exception as e:
+            print(f"Post {shortcode} konnte nicht geladen werden, neuer Versuch beim nächsten Lauf: {e}")
+            continue
+        downloads.append((download_metadata if kind == FAILED_METADATA else download_post, post))
+
+    if not downloads:
+        return 0, set()
+    print(f"{len(downloads)} in früheren Läufen fehlgeschlagene Posts werden erneut heruntergeladen.")
+    downloaded_posts = run_downloads(downloads, max_concurrency, retries, backoff, on_failure)
+    return downloaded_posts, {post.shortcode for _, post in downloads}
+
+class TokenBucket:
+    """
+    Gemeinsamer Ratenbegrenzer für alle Downloads: höchstens rate Anfragen pro Sekunde
+    im Mittel, kurze Spitzen bis capacity. Die Wartezeit wird als gedrosselte Zeit mitgezählt.
+
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.throttled_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            # Token reservieren, auch wenn das Konto dadurch negativ wird, und die Fehlmenge abwarten
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.throttled_seconds += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def wrap(self, action):
+        def rate_limited_action(*args, **kwargs):
+            self.acquire()
+            return action(*args, **kwargs)
+        return rate_limited_action
+
+class SharedRateController(RateController):
+    """
+    Ein RateController für die Loader aller Download-Threads (und im Batch-Modus aller Profile), damit Instagrams
+    Anfragelimits gemeinsam eingehalten werden. Instaloaders RateController ist nicht threadsicher (Zeitstempel-Listen
+    pro Anfragetyp), daher laufen seine Methoden hier nacheinander; wartende Threads reihen sich dabei ein.
+    Mit rate_limiter verbraucht jede Anfrage, die Instaloader drosselt (Feed-Seiten, Profil, einzelne Posts),
+    zusätzlich ein Token des gemeinsamen Token-Buckets.
+
+    """
+    def __init__(self, context, rate_limiter=None):
+        super().__init__(context)
+        self.rate_limiter = rate_limiter
+        self.lock = threading.RLock()
+
+    def wait_before_query(self, query_type):
+        with self.lock:
+            result = super().wait_before_query(query_type)
+        # Außerhalb der Sperre warten, damit der Token-Bucket die Threads unabhängig voneinander takten kann
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        return result
+
+    def handle_429(self, query_type):
+        with self.lock:
+            return super().handle_429(query_type)
+
+class RateControllerProvider:
+    """
+    Wird Instaloader als rate_controller übergeben und liefert allen Loadern denselben SharedRateController,
+    angelegt mit dem Kontext des ersten Loaders.
+
+    """
+    def __init__(self, rate_limiter=None):
+        self.rate_limiter = rate_limiter
+        self.controller = None
+        self.lock = threading.Lock()
+
+    def __call__(self, context):
+        with self.lock:
+            if self.controller is None:
+                self.controller = SharedRateController(context, self.rate_limiter)
+            return self.controller
+
+class InstaloaderPostSource:
+    """
+    Post-Quelle für ein Instagram-Profil über Instaloader. LocalPostSource in local_post_source.py
+    bietet dieselbe Schnittstelle für Läufe ohne Netzwerk.
+    Der Feed wird im Hauptthread gelesen, jeder Download-Thread hat einen eigenen Loader mit eigener HTTP-Session;
+    gemeinsam ist nur der SharedRateController aus rate_controller (ein RateControllerProvider, den sich mehrere
+    Quellen teilen können).
+
+    """
+    def __init__(self, profile_name, target_folder, rate_controller=None):
+        self.target_folder = target_folder
+        self.rate_controller = rate_controller if rate_controller is not None else RateControllerProvider()
+        self.thread_state = threading.local()
+        self.loader = self.create_loader()
+        # Profil laden
+        self.profile = Profile.from_username(self.loader.context, profile_name)
+
+    def create_loader(self):
+        # Instaloader initialisieren
+        return Instaloader( 
+            download_pictures=True,
+            download_videos=False, 
+            download_video_thumbnails=False,
+            compress_json=True, 
+            download_geotags=False, 
+            post_metadata_txt_pattern=None, 
+            max_connection_attempts=0,
+            download_comments=False,
+            rate_controller=self.rate_controller,
+            )
+
+    def thread_loader(self):
+        if not hasattr(self.thread_state, "loader"):
+            self.thread_state.loader = self.create_loader()
+        return self.thread_state.loader
+
+    def bind_post(self, loader, post):
+        # Der Post aus dem Feed verweist auf den Kontext des Hauptthreads; nachgeladene Felder sollen über
+        # die Session des Download-Threads laufen
+        return Post(loader.context, post._node, post._owner_profile)
+
+    def get_posts(self):
+        return self.profile.get_posts()
+
+    def get_post(self, shortcode):
+        return Post.from_shortcode(self.loader.context, shortcode)
+
+    def download_post(self, post):
+        loader = self.thread_loader()
+        loader.download_post(self.bind_post(loader, post), target=self.target_folder)
+
+    def download_metadata(self, post):
+        # Nur die Metadaten-Datei schreiben, ohne das Bild erneut herunterzuladen
+        loader = self.thread_loader()
+        post = self.bind_post(loader, post)
+        os.makedirs(self.target_folder, exist_ok=True)
+        filename = os.path.join(self.target_folder, loader.format_filename(post, target=self.target_folder))
+        loader.save_metadata_json(filename, post)
 
 # Hauptfunktion
-def download_and_sort_instagram_data(profile_name, base_download_path, start_date, end_date, update_metadata, start_date_metadata):
+def download_and_sort_instagram_data(profile_name, base_download_path, start_date, end_date, update_metadata, start_date_metadata, write_json_files=True, max_concurrency=4, retries=3, backoff=1.0, post_source=None, rate_limiter=None, rate_controller=None):
     # Überprüfen ob Ordner des Profils bereits existiert
     profile_folder = os.path.join(base_download_path, profile_name)
+    # Feed nach neuen Posts durchsuchen (sonst nur fehlgeschlagene Posts erneut laden)
+    read_feed = True
     
     # Wenn der Ordner bereits existiert die letzten Post-Daten anpassen
     if os.path.exists(profile_folder):
@@ -99,8 +377,12 @@ def download_and_sort_instagram_data(profile_name, base_download_path, start_dat
                 if update_metadata and start_date_metadata > start_date:
                     start_date_metadata = start_date
             else:
-                print(f"Das Enddatum {end_date.strftime('%Y-%m-%d %H:%M:%S')} liegt vor dem letzten bereits heruntergeladenen Post vom {last_image_datetime.strftime('%Y-%m-%d %H:%M:%S')}. Der Download wird abgebrochen.")
-                return
+                print(f"Das Enddatum {end_date.strftime('%Y-%m-%d %H:%M:%S')} liegt vor dem letzten bereits heruntergeladenen Post vom {last_image_datetime.strftime('%Y-%m-%d %H:%M:%S')}.")
+                if not post_index.failed_posts(profile_folder):
+                    print("Der Download wird abgebrochen.")
+                    return 0
+                print("Es werden nur die in früheren Läufen fehlgeschlagenen Posts erneut heruntergeladen.")
+                read_feed = False
         else:
             print("Keine Bilddateien im Ordner gefunden.")
         
@@ -113,78 +395,177 @@ def download_and_sort_instagram_data(profile_name, base_download_path, start_dat
         os.makedirs(os.path.join(profile_folder, "jpg"), exist_ok=True)
         os.makedirs(os.path.join(profile_folder, "json"), exist_ok=True)
 
-    # Instaloader initialisieren
-    all_loader = Instaloader( 
-        download_pictures=True,
-        download_videos=False, 
-        download_video_thumbnails=False,
-        compress_json=True, 
-        download_geotags=False, 
-        post_metadata_txt_pattern=None, 
-        max_connection_attempts=0,
-        download_comments=False,
-        )
-    
-    metadata_loader = Instaloader( 
-        download_pictures=False,
-        download_videos=False, 
-        download_video_thumbnails=False,
-        compress_json=True, 
-        download_geotags=False, 
-        post_metadata_txt_pattern=None, 
-        max_connection_attempts=0,
-        download_comments=False,
-        )
+    #Metadaten updaten
+    if update_metadata:
+        shutil.rmtree(os.path.join(profile_folder, "json"))
+        os.makedirs(os.path.join(profile_folder, "json"), exist_ok=True)
 
-    # Profil laden
-    profile = Profile.from_username(all_loader.context, profile_name)
-    posts = profile.get_posts()
+    # Downloads landen direkt im raw-Ordner des Profils, ohne das Arbeitsverzeichnis zu wechseln;
+    # die Post-Quelle legt ihn erst beim ersten Download an
+    raw_folder = os.path.join(profile_folder, "raw")
+    if post_source is None:
+        # Ohne eigenen rate_controller werden auch Feed- und Profilabfragen über den Token-Bucket getaktet
+        if rate_controller is None and rate_limiter is not None:
+            rate_controller = RateControllerProvider(rate_limiter)
+        post_source = InstaloaderPostSource(profile_name, raw_folder, rate_controller)
 
-    metadata_profile = Profile.from_username(metadata_loader.context, profile_name)
-    metadata = metadata_profile.get_posts()
+    # Shortcodes der heruntergeladenen Posts für den Post-Index merken
+    shortcodes = {}
 
-    # Arbeitsverzeichnis ändern, damit Instaloader die Dateien im richtigen Ordner speichert
-    original_cwd = os.getcwd()
-    os.chdir(profile_folder)
+    def download_post(post):
+        post_source.download_post(post)
+        shortcodes[post.date_utc.strftime("%Y-%m-%d_%H-%M-%S_UTC")] = getattr(post, "shortcode", None)
 
-    downloaded_posts = 0  
+    download_metadata = post_source.download_metadata
+    if rate_limiter is not None:
+        download_post = rate_limiter.wrap(download_post)
+        download_metadata = rate_limiter.wrap(download_metadata)
 
-    # Nur Bilder herunterladen, die im angegebenen Zeitraum liegen
-    for post in posts:
-        post_datetime = post.date_utc
-        if start_date <= post_datetime <= end_date and not post.is_video:
-            all_loader.download_post(post, target="raw")
-            downloaded_posts += 1
-        elif post_datetime < start_date:
-            break
+    # Endgültig fehlgeschlagene Posts merken, damit der nächste Lauf sie erneut versucht
+    failures = []
 
-    #Metadaten updaten
-    if update_metadata:
-        shutil.rmtree(os.path.join(profile_folder, "json"))
-        os.makedirs(os.path.join(profile_folder, "json"), exist_ok=True)
-        for data in metadata:
-            metadata_datetime = data.date_utc
-            if start_date_metadata <= metadata_datetime < start_date:
-                print(metadata_datetime)
-                metadata_loader.download_post(data, target="raw")
-                downloaded_posts += 1
-            elif metadata_datetime < start_date_metadata:
-                break                
+    def on_failure(post, action, error):
+        kind = FAILED_METADATA if action is download_metadata else FAILED_POST
+        failures.append((getattr(post, "shortcode", None), post.date_utc, kind, str(error)))
 
-    os.chdir(original_cwd)
+    with metrics.timer("download"):
+        downloaded_posts, retried_shortcodes = retry_failed_posts(
+            profile_folder, post_source, download_post, download_metadata, max_concurrency, retries, backoff, on_failure,
+        )
+        if read_feed:
+            # Bereits erneut versuchte Posts nicht ein zweites Mal laden
+            feed = (post for post in post_source.get_posts() if getattr(post, "shortcode", None) not in retried_shortcodes)
+            downloaded_posts += download_posts_concurrently(
+                feed, start_date, end_date, update_metadata, start_date_metadata,
+                download_post, download_metadata, max_concurrency, retries, backoff, on_failure,
+            )
+    metrics.count("posts_heruntergeladen", downloaded_posts)
+
+    failed_shortcodes = {shortcode for shortcode, *_ in failures}
+    post_index.clear_failed_posts(profile_folder, [shortcode for shortcode in retried_shortcodes if shortcode not in failed_shortcodes])
+    post_index.record_failed_posts(profile_folder, [failure for failure in failures if failure[0] is not None])
+    metrics.count("posts_fehlgeschlagen", len(failures))
+    if failures:
+        print(f"{len(failures)} Posts sind fehlgeschlagen und werden beim nächsten Lauf erneut versucht.")
+    if None in failed_shortcodes:
+        print("Warnung: Fehlgeschlagene Posts ohne Shortcode können nicht erneut versucht werden.")
 
     # Wenn keine Bilder heruntergeladen wurden, Skript beenden
     if downloaded_posts == 0:
+        # Reste fehlgeschlagener Downloads verwerfen, die Posts werden beim nächsten Lauf erneut geladen
+        if os.path.exists(raw_folder):
+            shutil.rmtree(raw_folder)
         print(f"Keine Bilder im angegebenen Zeitraum ({start_date.strftime('%Y-%m-%d %H:%M:%S')} bis {end_date.strftime('%Y-%m-%d %H:%M:%S')}) gefunden.")
-        return
+        return 0
 
-    # Dateien nach Typ sortieren
-    sort_files_by_extension(profile_folder)
+    # Dateien nach Typ sortieren und neue Bilder in den Post-Index aufnehmen
+    moved_jpgs = sort_files_by_extension(profile_folder)
+    post_index.register_images(profile_folder, moved_jpgs, shortcodes, with_json=write_json_files)
 
-    # .xz Dateien entpacken
+    # Metadaten aus den .xz Dateien in die Datenbank des Profils übernehmen
     xz_folder = os.path.join(profile_folder, "xz")
-    json_folder = os.path.join(profile_folder, "json")
-    extract_xz_files(xz_folder, json_folder)
+    ingest_xz_metadata(xz_folder, os.path.join(profile_folder, METADATA_DATABASE))
+
+    # .xz Dateien entpacken (nur noch nötig, wenn einzelne .json Dateien gebraucht werden)
+    if write_json_files:
+        json_folder = os.path.join(profile_folder, "json")
+        extract_xz_files(xz_folder, json_folder)
+    else:
+        shutil.rmtree(xz_folder)
+
+    return downloaded_posts
+
+def load_batch_progress(progress_path):
+    if os.path.exists(progress_path):
+        with open(progress_path, "r", encoding="utf-8") as progress_file:
+            return json.load(progress_file)
+    return {}
+
+def save_batch_progress(progress_path, progress):
+    temp_path = progress_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as progress_file:
+        json.dump(progress, progress_file, indent=2)
+    os.replace(temp_path, progress_path)
+
+def download_profiles(jobs, base_download_path, requests_per_second=1.0, burst=10, parallel_profiles=3,
+                      max_concurrency=4, retries=3, backoff=1.0, post_source_factory=None):
+    """
+    Lädt mehrere Profile gemeinsam herunter. jobs ist eine Liste von (Profil, Startdatum, Enddatum).
+    Alle Profile teilen sich einen Token-Bucket und einen SharedRateController, so dass Downloads wie auch Feed-,
+    Profil- und Post-Abfragen gemeinsam gedrosselt werden. Der Fortschritt wird pro Profil in batch_progress.json
+    gespeichert, und bereits abgeschlossene Profile werden bei einem erneuten Lauf übersprungen.
+
+    """
+    os.makedirs(base_download_path, exist_ok=True)
+    progress_path = os.path.join(base_download_path, "batch_progress.json")
+    progress = load_batch_progress(progress_path)
+    progress_lock = threading.Lock()
+    rate_limiter = TokenBucket(requests_per_second, burst)
+    # Ein RateController für die Instaloader-Abfragen aller Profile, ebenfalls über den Token-Bucket getaktet
+    rate_controller = RateControllerProvider(rate_limiter)
+    # In diesem Lauf heruntergeladene Posts (übersprungene Profile zählen nicht mit)
+    run_posts = {}
+
+    def run_job(profile_name, start_date, end_date):
+        window = f"{start_date.isoformat()}/{end_date.isoformat()}"
+        with progress_lock:
+            entry = progress.get(profile_name, {})
+            if entry.get("status") == "fertig" and entry.get("window") == window:
+                print(f"Profil {profile_name} ist für {window} bereits abgeschlossen.")
+                return
+            progress[profile_name] = {"status": "läuft", "window": window}
+            save_batch_progress(progress_path, progress)
+
+        post_source = None
+        if post_source_factory is not None:
+            post_source = post_source_factory(profile_name, os.path.join(base_download_path, profile_name, "raw"))
+
+        started = time.monotonic()
+        try:
+            downloaded_posts = download_and_sort_instagram_data(
+                profile_name, base_download_path, start_date, end_date, False, start_date,
+                max_concurrency=max_concurrency, retries=retries, backoff=backoff,
+                post_source=post_source, rate_limiter=rate_limiter, rate_controller=rate_controller,
+            )
+            status = "fertig"
+        except Exception as e:
+            print(f"Fehler beim Profil {profile_name}: {e}")
+            downloaded_posts = 0
+            status = "fehlgeschlagen"
+        seconds = time.monotonic() - started
+
+        with progress_lock:
+            progress[profile_name] = {
+                "status": status,
+                "window": window,
+                "posts": downloaded_posts,
+                "seconds": round(seconds, 2),
+                "posts_per_second": round(downloaded_posts / seconds, 2) if seconds > 0 else 0.0,
+                "finished": datetime.now().isoformat(timespec="seconds"),
+            }
+            save_batch_progress(progress_path, progress)
+            run_posts[profile_name] = downloaded_posts
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=parallel_profiles) as executor:
+        for future in [executor.submit(run_job, *job) for job in jobs]:
+            future.result()
+    total_seconds = time.monotonic() - started
+
+    # Zusammenfassung des Laufs
+    total_posts = sum(run_posts.values())
+    summary = {
+        "posts": total_posts,
+        "seconds": round(total_seconds, 2),
+        "posts_per_second": round(total_posts / total_seconds, 2) if total_seconds > 0 else 0.0,
+        "throttled_seconds": round(rate_limiter.throttled_seconds, 2),
+    }
+    for profile_name, _, _ in jobs:
+        entry = progress.get(profile_name, {})
+        print(f"{profile_name}: {entry.get('status')}, {entry.get('posts', 0)} Posts, {entry.get('posts_per_second', 0.0)} Posts/s")
+    print(f"Gesamt: {summary['posts']} Posts in {summary['seconds']} s ({summary['posts_per_second']} Posts/s), "
+          f"davon {summary['throttled_seconds']} s gedrosselt (summiert über alle Anfragen)")
+    return summary
 
 if __name__ == "__main__":
     PROFILE = "csu"
@@ -196,5 +577,23 @@ if __name__ == "__main__":
     #Metadaten können auch weiter in die Vergangenheit aktualisiert werden ohne die jpg neu herunterzuladen
     update_metadata = False
     start_date_metadata = datetime(2000, 1, 1)
+
+    # Gleichzeitige Downloads und Wiederholungen bei Verbindungsfehlern
+    max_concurrency = 4
+    retries = 3
+    backoff = 1.0
     
-    download_and_sort_instagram_data(PROFILE, BASE_DOWNLOAD_PATH, start_date, end_date, update_metadata, start_date_metadata)
\ No newline at end of file
+    # Mehrere Profile gemeinsam herunterladen statt ein Profil pro Lauf
+    batch_download = False
+    batch_jobs = [(profile, start_date, end_date) for profile in ["afd.bund", "cdu", "csu", "die_gruenen", "dielinke", "fdp", "spdde"]]
+    requests_per_second = 1.0
+
+    # Keine Ausgabe pro entpackter Datei, stattdessen run_metrics.json/.csv im Download-Ordner
+    instrumentation.configure(quiet=True)
+
+    if batch_download:
+        download_profiles(batch_jobs, BASE_DOWNLOAD_PATH, requests_per_second, max_concurrency=max_concurrency, retries=retries, backoff=backoff)
+    else:
+        download_and_sort_instagram_data(PROFILE, BASE_DOWNLOAD_PATH, start_date, end_date, update_metadata, start_date_metadata, max_concurrency=max_concurrency, retries=retries, backoff=backoff)
+
+    metrics.write_summary(BASE_DOWNLOAD_PATH, "run_metrics")
\ No newline at end of file
@@ -1,57 +1,409 @@
 import os
 import csv
+import time
 import re
 import json
-from PIL import Image, ImageDraw
+import sqlite3
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from PIL import Image
 import numpy as np
+from collections import Counter
+import post_index
+from post_index import METADATA_DATABASE
+import perceptual_hash
+from perceptual_hash import MAX_HASH_DISTANCE, MAX_COLOR_DIFFERENCE
+import instrumentation
+from instrumentation import metrics, progress, profiled
 
-def calculate_color_percentage(image_path, target_rgb_list, overlay_folder, delta):
+# Markierungsfarbe für die Ziel-Pixel im Overlay
+OVERLAY_COLOR = (252, 10, 228)
+OVERLAY_MODES = ("none", "sample", "all")
+# Verkleinerungsfaktoren, die der JPEG-Decoder direkt über die DCT-Skalierung liefert
+DECODE_SCALES = (1, 2, 4, 8)
+
+@lru_cache(maxsize=None)
+def build_color_distance_lut(target_rgb_tuple):
     """
-    Berechnet den Anteil der Pixel, die mit einem der Ziel-RGB-Werte innerhalb eines Deltas übereinstimmen,
-    und erzeugt ein Overlay-Bild zur Visualisierung.
+    Erzeugt eine Lookup-Tabelle über alle 2^24 RGB-Farben mit dem kleinsten Chebyshev-Abstand
+    zur Palette. Die Tabelle wird pro Palette einmal berechnet und gilt für jedes Delta.
+
+    """
+    lut = np.full((256, 256, 256), 255, dtype=np.uint8)
+    channel_values = np.arange(256, dtype=np.int16)
+
+    # Der Abstand zerfällt pro Kanal, daher genügen drei 256er-Vektoren pro Zielfarbe
+    for target_rgb in target_rgb_tuple:
+        dr, dg, db = (np.abs(channel_values - value).astype(np.uint8) for value in target_rgb)
+        distance = np.maximum(np.maximum(dr[:, None, None], dg[None, :, None]), db[None, None, :])
+        np.minimum(lut, distance, out=lut)
+    return lut.ravel()
+
+def palette_key(target_rgb_list):
+    return tuple(tuple(int(value) for value in target_rgb) for target_rgb in target_rgb_list)
+
+# In Worker-Prozessen: vom Hauptprozess gespeicherte Tabellen, nur lesend gemappt
+_mapped_luts = {}
+
+def get_color_distance_lut(target_rgb_list):
+    key = palette_key(target_rgb_list)
+    if key in _mapped_luts:
+        return _mapped_luts[key]
+    return build_color_distance_lut(key)
 
+def save_color_distance_luts(target_rgb_dict, lut_folder):
     """
+    Speichert die Lookup-Tabelle jeder Palette einmal als .npy-Datei für die Worker-Prozesse. Die Worker mappen
+    sie nur lesend und teilen sich so dieselben Seiten im Dateicache, statt je 16 MB pro Palette selbst zu berechnen.
+    Gibt Palette -> Pfad zurück.
+
+    """
+    lut_paths = {}
+    for target_rgb_list in target_rgb_dict.values():
+        key = palette_key(target_rgb_list)
+        if key not in lut_paths:
+            lut_paths[key] = os.path.join(lut_folder, f"lut_{len(lut_paths)}.npy")
+            # Ohne den Cache des Hauptprozesses zu füllen, dort wird die Tabelle nicht gebraucht
+            np.save(lut_paths[key], build_color_distance_lut.__wrapped__(key))
+    return lut_paths
+
+def calculate_color_distance_map(image_array, target_rgb_list):
+    """
+    Berechnet pro Pixel den kleinsten Chebyshev-Abstand (größte Kanalabweichung) zu einem der Ziel-RGB-Werte.
+    Ein Pixel liegt genau dann innerhalb eines Deltas, wenn dieser Abstand <= Delta ist.
+
+    """
+    lut = get_color_distance_lut(target_rgb_list)
+
+    # RGB zu einem 24-Bit-Index packen und mit einem einzigen Zugriff in der Tabelle nachschlagen
+    packed = image_array[..., 0].astype(np.uint32) << 16
+    packed |= image_array[..., 1].astype(np.uint32) << 8
+    packed |= image_array[..., 2]
+    return lut.take(packed)
+
+def shares_from_distance_map(distance_map, deltas):
+    # Ein Histogramm der Abstände genügt, um beliebig viele Deltas abzulesen
+    cumulative_counts = np.cumsum(np.bincount(distance_map.ravel(), minlength=256))
+    total_pixel_count = distance_map.size
+
+    shares = []
+    for delta in deltas:
+        target_pixel_count = cumulative_counts[min(int(delta), 255)] if delta >= 0 else 0
+        shares.append(round(target_pixel_count / total_pixel_count, 4))
+    return shares
+
+def load_rgb_array(image_path, decode_scale=1):
+    """
+    Dekodiert ein Bild als RGB-Array. Bei decode_scale > 1 dekodiert der JPEG-Decoder direkt
+    in 1/2, 1/4 oder 1/8 der Auflösung, ohne das volle Bild zu erzeugen.
+
+    """
+    if decode_scale not in DECODE_SCALES:
+        raise ValueError(f"Ungültiger Skalierungsfaktor: {decode_scale} (erlaubt: {DECODE_SCALES})")
+
     image = Image.open(image_path)
+    if decode_scale > 1:
+        # draft wirkt nur bei JPEG-Dateien, andere Formate werden voll dekodiert
+        image.draft('RGB', (max(1, image.width // decode_scale), max(1, image.height // decode_scale)))
     image = image.convert('RGB')
-    
-    image_array = np.array(image)
-    
-    mask = np.zeros(image_array.shape[:2], dtype=bool)
 
-    # Iteriere über Ziel-RGB-Werte und aktualisiere die Maske
-    for target_rgb in target_rgb_list:
-        diff = np.abs(image_array - target_rgb)
-        mask |= np.all(diff <= delta, axis=-1)
-    
-    # Zähle, wie viele Pixel innerhalb des Deltas liegen
-    target_pixel_count = np.sum(mask)
-    # Gesamtanzahl der Pixel im Bild
-    total_pixel_count = image_array.shape[0] * image_array.shape[1]
-    
-    if True:
-        overlay_image = image.copy()
-        draw = ImageDraw.Draw(overlay_image)
-        # Färbe die Ziel-Pixel
-        for y in range(image_array.shape[0]):
-            for x in range(image_array.shape[1]):
-                if mask[y, x]:
-                    draw.point((x, y), fill=(252, 10, 228))  # Markierung
-        
-        # Speichere das bearbeitete Bild im Overlay-Ordner
-        if not os.path.exists(overlay_folder):
-            os.makedirs(overlay_folder)
-        
-        base_filename = os.path.basename(image_path)
-        overlay_filename = f"{os.path.splitext(base_filename)[0]}_delta{delta}.jpg"
-        overlay_filepath = os.path.join(overlay_folder, overlay_filename)
-        
-        overlay_image.save(overlay_filepath)
-    
-    # Berechne den Anteil der Ziel-Pixel
-    result = target_pixel_count / total_pixel_count
-    return round(result, 4)
+    return np.array(image)
+
+@profiled
+def calculate_color_percentages(image_path, target_rgb_list, overlay_folder, deltas, save_overlay=True, decode_scale=1):
+    """
+    Berechnet die Farbanteile für mehrere Deltas aus einem einzigen Dekodier- und Abstandsdurchlauf
+    und erzeugt optional pro Delta ein Overlay-Bild zur Visualisierung.
+
+    """
+    with metrics.timer("dekodieren"):
+        image_array = load_rgb_array(image_path, decode_scale)
+    metrics.count("bytes_gelesen", os.path.getsize(image_path))
+
+    with metrics.timer("maske"):
+        distance_map = calculate_color_distance_map(image_array, target_rgb_list)
+        shares = shares_from_distance_map(distance_map, deltas)
+
+    if save_overlay:
+        with metrics.timer("overlay"):
+            for delta in deltas:
+                save_overlay_image(image_array, distance_map <= delta, image_path, overlay_folder, delta)
+
+    return shares
+
+def calculate_color_percentage(image_path, target_rgb_list, overlay_folder, delta, save_overlay=True, decode_scale=1):
+    """
+    Berechnet den Anteil der Pixel, die mit einem der Ziel-RGB-Werte innerhalb eines Deltas übereinstimmen,
+    und erzeugt optional ein Overlay-Bild zur Visualisierung.
+
+    """
+    return calculate_color_percentages(image_path, target_rgb_list, overlay_folder, [delta], save_overlay, decode_scale)[0]
+
+def save_overlay_image(image_array, mask, image_path, overlay_folder, delta):
+    # Färbe die Ziel-Pixel direkt im Array ein statt Pixel für Pixel zu zeichnen
+    overlay_array = image_array.copy()
+    overlay_array[mask] = OVERLAY_COLOR
+
+    # Speichere das bearbeitete Bild im Overlay-Ordner
+    os.makedirs(overlay_folder, exist_ok=True)
+
+    base_filename = os.path.basename(image_path)
+    overlay_filename = f"{os.path.splitext(base_filename)[0]}_delta{delta}.jpg"
+    overlay_filepath = os.path.join(overlay_folder, overlay_filename)
+
+    Image.fromarray(overlay_array).save(overlay_filepath)
+    metrics.count("bytes_geschrieben", os.path.getsize(overlay_filepath))
+
+def should_save_overlay(overlay_mode, image_index, overlay_sample_every):
+    # "none": keine Overlays, "sample": jedes n-te Bild pro Partei, "all": jedes Bild
+    if overlay_mode not in OVERLAY_MODES:
+        raise ValueError(f"Unbekannter Overlay-Modus: {overlay_mode} (erlaubt: {', '.join(OVERLAY_MODES)})")
+    if overlay_mode == "all":
+        return True
+    if overlay_mode == "sample":
+        return image_index % overlay_sample_every == 0
+    return False
+
+def post_name(filename):
+    # Slides eines Karussells teilen sich die Metadaten des Posts (ohne _<Slide>-Suffix)
+    return re.sub(r'_\d+$', '', os.path.splitext(filename)[0])
+
+def find_json_file(json_folder, filename):
+    json_file_path = os.path.join(json_folder, filename.replace(".jpg", ".json"))
+    if os.path.exists(json_file_path):
+        return json_file_path
+    return os.path.join(json_folder, post_name(filename) + ".json")
+
+def read_json_metadata(json_folder, filename):
+    # Likes und Kommentarzahl aus Json auslesen
+    likes = None
+    comments = None
+    json_file_path = find_json_file(json_folder, filename)
+    if os.path.exists(json_file_path):
+        metrics.count("bytes_gelesen", os.path.getsize(json_file_path))
+        with open(json_file_path, 'r', encoding='utf-8') as jsonfile:
+            data = json.load(jsonfile)
+            if 'node' in data and 'edge_media_preview_like' in data['node']:
+                likes = data['node']['edge_media_preview_like']['count']
+            if 'node' in data and 'comments' in data['node']:
+                comments = data['node']['comments']
+    return likes, comments
+
+def load_metadata_store(party_path):
+    # Likes und Kommentare aller Posts eines Profils mit einer einzigen Abfrage laden
+    database_path = os.path.join(party_path, METADATA_DATABASE)
+    if not os.path.exists(database_path):
+        return None
+
+    connection = sqlite3.connect(database_path)
+    try:
+        # Die Datenbank kann auch nur den Post-Index enthalten
+        if connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'metadata'").fetchone() is None:
+            return None
+        rows = connection.execute("SELECT post, likes, comments FROM metadata").fetchall()
+    finally:
+        connection.close()
+    return {post: (likes, comments) for post, likes, comments in rows}
+
+def build_csv_row(task):
+    """
+    Verarbeitet ein einzelnes Bild (Dateiname zerlegen, Metadaten lesen, Farbanteil berechnen)
+    und gibt die fertige CSV-Zeile zurück. Läuft seriell oder in einem Worker-Prozess.
+
+    """
+    party_folder, jpg_folder, _, filename, save_overlay, _, _ = task
+    target_rgb_list = _worker_state["target_rgb_dict"][party_folder]
+    deltas = _worker_state["deltas"]
+    overlay_folder = _worker_state["overlay_folder"]
+    decode_scale = _worker_state["decode_scale"]
+
+    row = build_row_fields(task)
+    jpg_file_path = os.path.join(jpg_folder, filename)
+    color_percentages = calculate_color_percentages(jpg_file_path, target_rgb_list, overlay_folder, deltas, save_overlay, decode_scale)
+
+    return row + color_percentages
+
+def build_row_fields(task):
+    # Spalten einer CSV-Zeile vor den Farbanteilen
+    party_folder, _, json_folder, filename, _, post_metadata, image_fields = task
+
+    # Datum, Uhrzeit und Karussell-Position stammen aus dem Post-Index
+    date, time, slideshow, slide = image_fields
+
+    # Metadaten aus der Datenbank, sonst aus der einzelnen Json-Datei
+    with metrics.timer("metadaten"):
+        if post_metadata is not None:
+            likes, comments = post_metadata
+        else:
+            likes, comments = read_json_metadata(json_folder, filename)
+
+    return [party_folder, date, time, slideshow, slide, likes, comments, filename]
+
+def build_csv_row_in_worker(task):
+    # Im Worker-Prozess: Metriken pro Aufgabe sammeln und mit der Zeile an den Hauptprozess zurückgeben
+    metrics.reset()
+    with metrics.timer("bild_gesamt"):
+        row = build_csv_row(task)
+    return row, metrics.snapshot()
+
+# Zustand pro Prozess: wird einmal beim Start gesetzt statt mit jeder Aufgabe übertragen
+_worker_state = {}
 
-def create_csv_from_project(project_path, parties, target_rgb_dict):
+def init_worker(target_rgb_dict, deltas, overlay_folder, decode_scale=1, lut_paths=None):
+    _worker_state["target_rgb_dict"] = target_rgb_dict
+    _worker_state["deltas"] = deltas
+    _worker_state["overlay_folder"] = overlay_folder
+    _worker_state["decode_scale"] = decode_scale
+
+    if lut_paths is not None:
+        # Worker-Prozess: die Tabellen des Hauptprozesses einbinden statt sie neu zu berechnen
+        for key, lut_path in lut_paths.items():
+            _mapped_luts[key] = np.asarray(np.load(lut_path, mmap_mode='r'))
+    else:
+        # Seriell: Lookup-Tabellen einmal vorberechnen
+        for target_rgb_list in target_rgb_dict.values():
+            get_color_distance_lut(target_rgb_list)
+
+def collect_image_tasks(database_folder, parties, overlay_mode, overlay_sample_every):
+    # Feste Reihenfolge der Aufgaben, damit serieller und paralleler Modus dieselbe CSV schreiben
+    tasks = []
+    for party_folder in os.listdir(database_folder):
+        if party_folder not in parties:
+            continue
+
+        party_path = os.path.join(database_folder, party_folder)
+        if not os.path.isdir(party_path):
+            continue
+
+        jpg_folder = os.path.join(party_path, "jpg")
+        json_folder = os.path.join(party_path, "json")
+        metadata = load_metadata_store(party_path)
+
+        # Arbeitsliste aus dem Post-Index statt aus einem Verzeichnisdurchlauf
+        for image_index, (filename, *image_fields) in enumerate(post_index.list_images(party_path)):
+            save_overlay = should_save_overlay(overlay_mode, image_index, overlay_sample_every)
+            post_metadata = metadata.get(post_name(filename)) if metadata is not None else None
+            tasks.append((party_folder, jpg_folder, json_folder, filename, save_overlay, post_metadata, tuple(image_fields)))
+    return tasks
+
+def compute_csv_rows(tasks, party_rgb_dict, deltas, overlay_folder, workers, decode_scale=1, groups=None):
+    """
+    Liefert die CSV-Zeilen in Aufgabenreihenfolge, seriell oder über einen Prozess-Pool.
+    Mit groups (eine Bildgruppe pro Aufgabe, siehe image_groups) wird pro Gruppe und Palette nur das erste Bild
+    berechnet und dessen Farbanteile für die übrigen Bilder der Gruppe übernommen.
+
+    """
+    if groups is not None:
+        yield from compute_deduplicated_rows(tasks, party_rgb_dict, deltas, overlay_folder, workers, decode_scale, groups)
+        return
+
+    if workers > 1 and len(tasks) > 1:
+        # Bilder auf mehrere Prozesse verteilen; map liefert die Zeilen in Aufgabenreihenfolge
+        chunksize = max(1, len(tasks) // (workers * 8))
+        with tempfile.TemporaryDirectory() as lut_folder:
+            lut_paths = save_color_distance_luts(party_rgb_dict, lut_folder)
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                     initargs=(party_rgb_dict, deltas, overlay_folder, decode_scale, lut_paths)) as executor:
+                for row, worker_metrics in executor.map(build_csv_row_in_worker, tasks, chunksize=chunksize):
+                    metrics.merge(worker_metrics)
+                    yield row
+    else:
+        init_worker(party_rgb_dict, deltas, overlay_folder, decode_scale)
+        for task in tasks:
+            with metrics.timer("bild_gesamt"):
+                row = build_csv_row(task)
+            yield row
+
+def compute_deduplicated_rows(tasks, party_rgb_dict, deltas, overlay_folder, workers, decode_scale, groups):
+    # Farbanteile pro (Bildgruppe, Palette); Bilder mit Overlay werden immer selbst berechnet
+    cache_keys = [(group, tuple(map(tuple, party_rgb_dict[task[0]]))) for task, group in zip(tasks, groups)]
+    computed_keys = set()
+    computed = []
+    for task_index, (task, cache_key) in enumerate(zip(tasks, cache_keys)):
+        save_overlay = task[4]
+        if save_overlay or cache_key not in computed_keys:
+            computed_keys.add(cache_key)
+            computed.append(task_index)
+
+    computed_rows = compute_csv_rows([tasks[task_index] for task_index in computed], party_rgb_dict, deltas,
+                                     overlay_folder, workers, decode_scale)
+    shares_cache = {}
+    next_computed = 0
+    for task_index, (task, cache_key) in enumerate(zip(tasks, cache_keys)):
+        if next_computed < len(computed) and computed[next_computed] == task_index:
+            row = next(computed_rows)
+            shares_cache.setdefault(cache_key, row[-len(deltas):])
+            next_computed += 1
+        else:
+            row = build_row_fields(task) + shares_cache[cache_key]
+            metrics.count("duplikate_uebernommen")
+        yield row
+
+def image_groups(tasks, hash_cache_file, workers=1, max_distance=MAX_HASH_DISTANCE, max_color_difference=MAX_COLOR_DIFFERENCE):
+    """
+    Ordnet jedem Bild eine Gruppe nahezu identischer Bilder über alle Parteien zu (Index des ersten Bilds der Gruppe).
+    Hash und Farbvorschau werden mit Größe und Änderungszeit der Datei in hash_cache_file gespeichert
+    und nur für neue oder geänderte Bilder neu berechnet.
+
+    """
+    hash_cache = load_manifest(hash_cache_file)
+    keys = [json.dumps([task[0], task[3], file_identity(os.path.join(task[1], task[3]))]) for task in tasks]
+    missing = [(key, os.path.join(task[1], task[3])) for task, key in zip(tasks, keys) if key not in hash_cache]
+    metrics.count("cache_treffer_hash", len(tasks) - len(missing))
+
+    if missing:
+        with metrics.timer("hashen"):
+            signatures = perceptual_hash.image_signatures([image_path for _, image_path in missing], workers)
+        for (key, _), signature in zip(missing, signatures):
+            hash_cache[key] = list(signature)
+    # Gleiches Format wie das Manifest, verdichtet auf die aktuellen Bilder
+    write_manifest(hash_cache_file, hash_cache, keys)
+
+    return perceptual_hash.group_near_duplicates([hash_cache[key] for key in keys], max_distance, max_color_difference)
+
+def file_identity(path):
+    # Größe und Änderungszeit identifizieren eine Datei, ohne sie zu lesen
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def task_cache_key(task, target_rgb_list, deltas, decode_scale=1, max_hash_distance=None):
+    party_folder, jpg_folder, json_folder, filename, _, post_metadata, _ = task
+    key = [
+        party_folder, filename, post_metadata,
+        file_identity(os.path.join(jpg_folder, filename)), file_identity(find_json_file(json_folder, filename)),
+        [list(target_rgb) for target_rgb in target_rgb_list], list(deltas), decode_scale,
+    ]
+    # Übernommene Farbanteile einer Bildgruppe nicht mit einzeln berechneten verwechseln
+    if max_hash_distance is not None:
+        key.append(max_hash_distance)
+    return json.dumps(key)
+
+def load_manifest(manifest_file):
+    manifest = {}
+    if os.path.exists(manifest_file):
+        with open(manifest_file, 'r', encoding='utf-8') as jsonlfile:
+            for line in jsonlfile:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Abgebrochene letzte Zeile eines unterbrochenen Laufs
+                    continue
+                manifest[entry["key"]] = entry["row"]
+    return manifest
+
+def write_manifest(manifest_file, manifest, keys):
+    # Manifest auf die aktuellen Bilder verdichten und atomar ersetzen
+    temp_file = manifest_file + ".tmp"
+    with open(temp_file, 'w', encoding='utf-8') as jsonlfile:
+        for key in keys:
+            jsonlfile.write(json.dumps({"key": key, "row": manifest[key]}) + "\n")
+    os.replace(temp_file, manifest_file)
+
+def create_csv_from_project(project_path, parties, target_rgb_dict, overlay_mode="all", overlay_sample_every=100, deltas=(40,), workers=1, incremental=False, decode_scale=1,
+                            deduplicate=False, max_hash_distance=MAX_HASH_DISTANCE):
     if os.path.exists(os.path.join(project_path, "Database")):
         database_folder = os.path.join(project_path, "Database")
     else:
@@ -62,62 +414,140 @@ def create_csv_from_project(project_path, parties, target_rgb_dict):
     output_file = os.path.join(project_path, "output.csv")
     # Ordner für Overlay-Bilder
     overlay_folder = os.path.join(project_path, "Overlay_Images")
+    # Manifest mit bereits berechneten Zeilen für den inkrementellen Modus
+    manifest_file = os.path.join(project_path, "output_manifest.jsonl")
+    # Perzeptuelle Hashes für die Erkennung wiederholter Bilder
+    hash_cache_file = os.path.join(project_path, "image_hashes.jsonl")
+
+    if workers > 1 and instrumentation.profiling_enabled():
+        # Der Profiler sieht nur den Hauptprozess, die Bilder werden daher seriell berechnet
+        print("Profiler aktiv, Bilder werden seriell berechnet")
+        workers = 1
+
+    metrics.reset()
+    with metrics.timer("aufgaben_sammeln"):
+        tasks = collect_image_tasks(database_folder, parties, overlay_mode, overlay_sample_every)
+    # Nur die Paletten der ausgewählten Parteien an die Worker geben
+    party_rgb_dict = {party: target_rgb_dict[party] for party in dict.fromkeys(task[0] for task in tasks)}
+    for party, target_rgb_list in party_rgb_dict.items():
+        print(party)
+        print(target_rgb_list)
+
+    header = ["Partei", "Datum", "Uhrzeit", "Slideshow", "Slide", "Likes", "Kommentare", "Dateiname"] + [f"RGB Anteil Delta {delta}" for delta in deltas]
+
+    # Wiederholte Bilder (Reposts, wiederkehrende Slides) nur einmal berechnen und als Spalte ausgeben
+    groups = None
+    if deduplicate:
+        groups = image_groups(tasks, hash_cache_file, workers, max_hash_distance)
+        group_sizes = Counter(groups)
+        header.append("Wiederholungen")
+        print(f"{len(group_sizes)} unterschiedliche Bilder unter {len(tasks)} Bildern gefunden.")
 
+    if incremental:
+        manifest = load_manifest(manifest_file)
+        keys = [task_cache_key(task, party_rgb_dict[task[0]], deltas, decode_scale, max_hash_distance if deduplicate else None)
+                for task in tasks]
+        pending = [(task_index, key) for task_index, key in enumerate(keys) if key not in manifest]
+        print(f"{len(tasks) - len(pending)} Bilder aus dem Manifest übernommen, {len(pending)} neu zu berechnen.")
+        metrics.count("cache_treffer_manifest", len(tasks) - len(pending))
+        metrics.count("cache_fehlend_manifest", len(pending))
+
+        # Neue Zeilen sofort anhängen, damit ein abgebrochener Lauf dort weitermacht
+        with open(manifest_file, 'a', encoding='utf-8') as jsonlfile:
+            pending_groups = [groups[task_index] for task_index, _ in pending] if deduplicate else None
+            rows = compute_csv_rows([tasks[task_index] for task_index, _ in pending], party_rgb_dict, deltas, overlay_folder,
+                                    workers, decode_scale, pending_groups)
+            computed_started = time.perf_counter()
+            for (_, key), row in zip(pending, rows):
+                progress(f"Schreibe Zeile: {row}")
+                manifest[key] = row
+                with metrics.timer("schreiben"):
+                    jsonlfile.write(json.dumps({"key": key, "row": row}) + "\n")
+                    jsonlfile.flush()
+            record_worker_utilization(time.perf_counter() - computed_started, workers)
+
+        write_manifest(manifest_file, manifest, keys)
+        rows = (manifest[key] for key in keys)
+    else:
+        rows = compute_csv_rows(tasks, party_rgb_dict, deltas, overlay_folder, workers, decode_scale, groups)
+
+    computed_started = time.perf_counter()
     with open(output_file, mode='w', newline='', encoding='utf-8') as csvfile:
         csv_writer = csv.writer(csvfile, quotechar='"', quoting=csv.QUOTE_MINIMAL, escapechar='\\')
-        csv_writer.writerow(["Partei", "Datum", "Uhrzeit", "Slideshow", "Slide", "Likes", "Kommentare", "Dateiname", "RGB Anteil Delta 50" , "RGB Anteil Delta 70", "RGB Anteil Delta 90"])
-        
-        # Iteriere durch alle Parteiordner im Projektordner
-        for party_folder in os.listdir(database_folder):
-            if party_folder not in parties:
-                continue
+        csv_writer.writerow(header)
 
-            party_path = os.path.join(database_folder, party_folder)
+        for task_index, row in enumerate(rows):
+            if deduplicate:
+                # Anzahl weiterer Bilder derselben Gruppe über alle Parteien
+                row = row + [group_sizes[groups[task_index]] - 1]
+            if not incremental:
+                progress(f"Schreibe Zeile: {row}")
+            with metrics.timer("schreiben"):
+                csv_writer.writerow(row)
+    if not incremental:
+        record_worker_utilization(time.perf_counter() - computed_started, workers)
+    metrics.count("bytes_geschrieben", os.path.getsize(output_file))
+
+    # Verarbeitete Bilder im Post-Index markieren
+    processed_files = {}
+    for party_folder, _, _, filename, *_ in tasks:
+        processed_files.setdefault(party_folder, []).append(filename)
+    for party_folder, filenames in processed_files.items():
+        post_index.mark_processed(os.path.join(database_folder, party_folder), filenames)
 
-            target_rgb_list = target_rgb_dict[party_folder]
-            print(party_folder)
-            print(target_rgb_list)
-
-            if os.path.isdir(party_path):
-                jpg_folder = os.path.join(party_path, "jpg")
-                json_folder = os.path.join(party_path, "json")
-
-                for filename in os.listdir(jpg_folder):
-                    if filename.endswith(".jpg"):                        
-                        base_filename = os.path.splitext(filename)[0]  
-                        split_base_filename = base_filename.split('_')  
-                        date = split_base_filename[0]  
-                        time = split_base_filename[1]  
-
-                        
-                        slideshow = 0
-                        slide = 1
-
-                        match = re.search(r'_(\d+)$', base_filename)
-                        if match:
-                            slideshow = 1
-                            slide = int(match.group(1))  
-
-                        # Likes und Kommentarzahl aus Json auslesen
-                        json_file_path = os.path.join(json_folder, filename.replace(".jpg", ".json"))
-                        if os.path.exists(json_file_path):
-                            with open(json_file_path, 'r', encoding='utf-8') as jsonfile:
-                                data = json.load(jsonfile)
-                                if 'node' in data and 'edge_media_preview_like' in data['node']:
-                                    likes = data['node']['edge_media_preview_like']['count']
-                                if 'node' in data and 'comments' in data['node']:
-                                    comments = data['node']['comments']
-
-                        
-                        jpg_file_path = os.path.join(jpg_folder, filename)
-                        color_percentage_50 = calculate_color_percentage(jpg_file_path, target_rgb_list, overlay_folder, 40)
-                  
-
-                        print(f"Schreibe Zeile: {[party_folder, date, time, slideshow, slide, likes, comments, filename,color_percentage_50]}")#, color_percentage_70, color_percentage_90]}")
-                        csv_writer.writerow([party_folder, date, time, slideshow, slide, likes, comments, filename,color_percentage_50])#, color_percentage_70, color_percentage_90])
-                        
     print(f"CSV-Datei wurde erstellt: {output_file}")
 
+    metrics.set("bilder", len(tasks))
+    metrics.write_summary(project_path, "run_metrics")
+    instrumentation.write_profile(project_path)
+
+def record_worker_utilization(seconds, workers):
+    # Anteil der Zeit, in der die Worker tatsächlich Bilder verarbeitet haben
+    busy_seconds = metrics.snapshot()["timings"].get("bild_gesamt", [0, 0.0])[1]
+    metrics.set("worker", workers)
+    metrics.set("berechnung_s", round(seconds, 3))
+    metrics.set("worker_auslastung", round(busy_seconds / (seconds * max(1, workers)), 3) if seconds > 0 else None)
+
+def report_decode_scale_error(project_path, parties, target_rgb_dict, delta=40, decode_scales=(2, 4, 8)):
+    """
+    Vergleicht die Farbanteile bei reduzierter Dekodierauflösung mit dem Farbanteil bei voller Auflösung
+    und schreibt den Fehler pro Bild in eine CSV. Pro Partei werden mittlerer und maximaler Fehler ausgegeben.
+
+    """
+    if os.path.exists(os.path.join(project_path, "Database")):
+        database_folder = os.path.join(project_path, "Database")
+    else:
+        print(f"Es existiert keine Database in: {project_path}")
+        return
+
+    report_file = os.path.join(project_path, "decode_scale_report.csv")
+    tasks = collect_image_tasks(database_folder, parties, "none", 1)
+
+    errors = {}
+    with open(report_file, mode='w', newline='', encoding='utf-8') as csvfile:
+        csv_writer = csv.writer(csvfile)
+        header = ["Partei", "Dateiname", "Farbanteil"]
+        for decode_scale in decode_scales:
+            header += [f"Farbanteil 1/{decode_scale}", f"Fehler 1/{decode_scale}"]
+        csv_writer.writerow(header)
+
+        for party_folder, jpg_folder, _, filename, *_ in tasks:
+            jpg_file_path = os.path.join(jpg_folder, filename)
+            target_rgb_list = target_rgb_dict[party_folder]
+            reference = calculate_color_percentage(jpg_file_path, target_rgb_list, None, delta, False)
+
+            row = [party_folder, filename, reference]
+            for decode_scale in decode_scales:
+                share = calculate_color_percentage(jpg_file_path, target_rgb_list, None, delta, False, decode_scale)
+                error = round(share - reference, 4)
+                errors.setdefault((party_folder, decode_scale), []).append(abs(error))
+                row += [share, error]
+            csv_writer.writerow(row)
+
+    for (party_folder, decode_scale), party_errors in errors.items():
+        print(f"{party_folder} 1/{decode_scale}: mittlerer Fehler {np.mean(party_errors):.4f}, maximaler Fehler {np.max(party_errors):.4f}")
+    print(f"Fehlerbericht wurde erstellt: {report_file}")
+
 if __name__ == "__main__":
     project_path = r"C:\Users\pasol\Pictures\Database_CulturalAnalytics"
     
@@ -134,7 +564,36 @@ if __name__ == "__main__":
 
     parties = ["csu"]
 
-    if os.path.exists(project_path):
-        create_csv_from_project(project_path, parties, target_rgb_dict)
+    # Overlay-Bilder: "none" (Produktion), "sample" (jedes n-te Bild pro Partei) oder "all"
+    overlay_mode = "sample"
+    overlay_sample_every = 100
+
+    # Deltas, für die je eine Spalte berechnet wird (Delta 40 entspricht dem Farbanteil in result.csv)
+    deltas = [40, 50, 70, 90]
+
+    # Anzahl der Worker-Prozesse (1 = seriell). Die Lookup-Tabellen (16 MB pro Partei) liegen nur einmal im
+    # Dateicache und werden von allen Workern gemappt; jeder Worker braucht zusätzlich rund 12 Bytes pro Bildpixel
+    # (1080 x 1080: etwa 15 MB) für Dekodierung und Abstandskarte
+    workers = os.cpu_count() or 1
+
+    # Nur neue oder geänderte Bilder berechnen, den Rest aus dem Manifest übernehmen
+    incremental = True
+
+    # Schneller Erkundungsmodus: JPEGs in 1/2, 1/4 oder 1/8 der Auflösung dekodieren (1 = volle Auflösung)
+    decode_scale = 1
+
+    # Keine Ausgabe pro Bild, stattdessen run_metrics.json/.csv im Projektordner; profile=True schreibt zusätzlich ein Profil
+    # (profile=True berechnet die Bilder seriell, da nur der Hauptprozess profiliert wird)
+    instrumentation.configure(quiet=True, profile=False)
+
+    # Nahezu identische Bilder (perzeptueller Hash) nur einmal berechnen, Spalte "Wiederholungen" ausgeben
+    deduplicate = True
+    # Fehler der reduzierten Auflösung gegenüber dem vollen Farbanteil vorab prüfen
+    report_decode_error = False
+
+    if os.path.exists(project_path) and report_decode_error:
+        report_decode_scale_error(project_path, parties, target_rgb_dict, deltas[0])
+    elif os.path.exists(project_path):
+        create_csv_from_project(project_path, parties, target_rgb_dict, overlay_mode, overlay_sample_every, deltas, workers, incremental, decode_scale, deduplicate)
     else:
         print(f"Pfad existiert nicht: {project_path}")
@@ -1,32 +1,26 @@
-import pandas as pd
 import os
-import matplotlib.pyplot as plt
+from plot_rendering import render, render_party_lines
+from dataset import load_dataset, iter_dataset_chunks
+from aggregation_cube import AggregationCube, update_cube
 
-def aggregate_color_share(input_csv_path, output_path):
+def aggregate_color_share(input_csv_path, output_path, df=None, render_pool=None, granularity="Monat", window=10,
+                          incremental=False, chunksize=None):
     try:
-        df = pd.read_csv(input_csv_path)
-
-        df['Datum'] = pd.to_datetime(df['Datum'])
-
-        df['Monat'] = df['Datum'].dt.to_period('M').astype(str)
-
-        result = (
-            df.groupby(['Partei', 'Monat'])['Farbanteil']
-            .mean()
-            .reset_index()
-            .rename(columns={'Farbanteil': 'durchschnittlicher Farbanteil'})
-        )
-
-        all_months = pd.period_range(result['Monat'].min(), result['Monat'].max(), freq='M').astype(str)
-
-        all_parties = result['Partei'].unique()
-        full_index = pd.MultiIndex.from_product([all_parties, all_months], names=['Partei', 'Monat'])
-        full_df = pd.DataFrame(index=full_index).reset_index()
-
-        result = pd.merge(full_df, result, on=['Partei', 'Monat'], how='left')
-        result['durchschnittlicher Farbanteil'] = result['durchschnittlicher Farbanteil'].fillna(0)
-
-        result['durchschnittlicher Farbanteil'] = result['durchschnittlicher Farbanteil'].round(4)
+        # Dichter Partei x Zeitraum-Würfel (standardmäßig Monate); Zeiträume ohne Bilder haben den Mittelwert 0
+        if incremental:
+            # Nur die seit dem letzten Lauf angehängten Zeilen von result.csv lesen, der Würfel liegt im Ausgabeordner
+            cube, affected_periods = update_cube(input_csv_path, output_path, granularity)
+            if affected_periods is not None:
+                print(f"Neue Zeilen in {len(affected_periods)} Zeiträumen eingerechnet.")
+        elif chunksize:
+            # Streaming: result.csv stückweise lesen, im Speicher bleiben nur ein Chunk und der Würfel
+            cube = AggregationCube.from_chunks(iter_dataset_chunks(input_csv_path, chunksize), granularity=granularity)
+        else:
+            # Der Runner übergibt einen bereits geladenen Datensatz
+            df = load_dataset(input_csv_path) if df is None else df
+            cube = AggregationCube.from_frame(df, granularity=granularity)
+        mean_share = cube.mean().round(4)
+        result = cube.to_long({'durchschnittlicher Farbanteil': mean_share})
 
         output_path_csv = os.path.join(output_path, "CSV.csv")
         output_path_plot = os.path.join(output_path, "Plot.jpg")
@@ -43,32 +37,26 @@ def aggregate_color_share(input_csv_path, output_path):
             "spdde": (215/255, 31/255, 29/255)   
         }
 
-        # Plot 
-        plt.figure(figsize=(10, 6))
-        for party in result['Partei'].unique():
-            party_data = result[result['Partei'] == party]
-            party_data['durchschnittlicher Farbanteil'] = party_data['durchschnittlicher Farbanteil'].rolling(window=10, center=True).mean()
-            color = party_colors.get(party, (0, 0, 0))  # Standardfarbe Schwarz, falls nicht definiert
-            plt.plot(party_data['Monat'], party_data['durchschnittlicher Farbanteil'], label=party, color=color)
-
-        plt.xlabel('Monat')
-        plt.ylabel('Durchschnittlicher Farbanteil')
-        plt.title('Durchschnittlicher Farbanteil pro Partei über die Zeit (geglättet)')
-        plt.legend()
-
-        all_ticks = result['Monat'].unique()
-        selected_ticks = all_ticks[::6] 
-        plt.xticks(ticks=selected_ticks, labels=selected_ticks, rotation=45)
+        # Plot: Glättung für alle Parteien zugleich, das Zeichnen übernimmt plot_rendering
+        smoothed = cube.smoothed(mean_share, window=window)
+        periods = smoothed.index.astype(str).to_numpy()
+        series = [
+            (party, periods, smoothed[party].to_numpy(), party_colors.get(party, (0, 0, 0)))  # Standardfarbe Schwarz, falls nicht definiert
+            for party in cube.parties
+        ]
 
-        plt.tight_layout()
+        selected_ticks = list(periods[::6])
 
-        plt.savefig(output_path_plot)
-        print(f"Das Diagramm wurde erfolgreich erstellt: {output_path_plot}")
+        render(render_pool, render_party_lines, output_path_plot, series,
+               granularity, 'Durchschnittlicher Farbanteil', 'Durchschnittlicher Farbanteil pro Partei über die Zeit (geglättet)',
+               ticks=(selected_ticks, selected_ticks, 45),
+               message=f"Das Diagramm wurde erfolgreich erstellt: {output_path_plot}")
 
     except Exception as e:
         print(f"Ein Fehler ist aufgetreten: {e}")
 
 
-input_csv_path = r"C:\\Users\\pasol\\Pictures\\Database_CulturalAnalytics\\02_Processed\\result.csv"
-output_path = r"C:\\Users\\pasol\\Pictures\\Database_CulturalAnalytics\\03_Analytics\\01_AggregatedColorTime"
-aggregate_color_share(input_csv_path, output_path)
+if __name__ == "__main__":
+    input_csv_path = r"C:\\Users\\pasol\\Pictures\\Database_CulturalAnalytics\\02_Processed\\result.csv"
+    output_path = r"C:\\Users\\pasol\\Pictures\\Database_CulturalAnalytics\\03_Analytics\\01_AggregatedColorTime"
+    aggregate_color_share(input_csv_path, output_path)
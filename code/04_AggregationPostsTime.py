@@ -1,35 +1,27 @@
-import pandas as pd
 import os
-import matplotlib.pyplot as plt
+from plot_rendering import render, render_party_lines
+from dataset import load_dataset, iter_dataset_chunks
+from aggregation_cube import AggregationCube, update_cube
 
-def aggregate_color_share(input_csv_path, output_path):
+def aggregate_color_share(input_csv_path, output_path, df=None, render_pool=None, granularity="Monat",
+                          window=10, window_cumulative=3, incremental=False, chunksize=None):
     try:
-        df = pd.read_csv(input_csv_path)
-
-        df['Datum'] = pd.to_datetime(df['Datum'])
-
-        df['Monat'] = df['Datum'].dt.to_period('M').astype(str)
-
-        result = (
-            df.groupby(['Partei', 'Monat']).size()
-            .reset_index(name='Anzahl der Posts')
-        )
-
-        result['Kumulative Anzahl'] = result.groupby('Partei')['Anzahl der Posts'].cumsum()
-
-        all_months = pd.period_range(result['Monat'].min(), result['Monat'].max(), freq='M').astype(str)
-
-        all_parties = result['Partei'].unique()
-        full_index = pd.MultiIndex.from_product([all_parties, all_months], names=['Partei', 'Monat'])
-        full_df = pd.DataFrame(index=full_index).reset_index()
-
-        result = pd.merge(full_df, result, on=['Partei', 'Monat'], how='left')
-        result['Anzahl der Posts'] = result['Anzahl der Posts'].fillna(0)
-        result['Kumulative Anzahl'] = result['Kumulative Anzahl'].fillna(0)
-
-
-        result['Anzahl der Posts'] = result['Anzahl der Posts'].astype(int)
-        result['Kumulative Anzahl'] = result['Kumulative Anzahl'].astype(int)
+        # Dichter Partei x Zeitraum-Würfel (standardmäßig Monate); die kumulative Anzahl läuft über Zeiträume ohne Posts weiter
+        if incremental:
+            # Nur die seit dem letzten Lauf angehängten Zeilen von result.csv lesen, der Würfel liegt im Ausgabeordner
+            cube, affected_periods = update_cube(input_csv_path, output_path, granularity)
+            if affected_periods is not None:
+                print(f"Neue Zeilen in {len(affected_periods)} Zeiträumen eingerechnet.")
+        elif chunksize:
+            # Streaming: result.csv stückweise lesen, im Speicher bleiben nur ein Chunk und der Würfel
+            cube = AggregationCube.from_chunks(iter_dataset_chunks(input_csv_path, chunksize), granularity=granularity)
+        else:
+            # Der Runner übergibt einen bereits geladenen Datensatz
+            df = load_dataset(input_csv_path) if df is None else df
+            cube = AggregationCube.from_frame(df, granularity=granularity)
+        counts = cube.count()
+        cumulative = cube.cumulative()
+        result = cube.to_long({'Anzahl der Posts': counts, 'Kumulative Anzahl': cumulative})
 
         output_path_csv = os.path.join(output_path, "CSV.csv")
         output_path_plot = os.path.join(output_path, "Plot_Anzahl.jpg")
@@ -48,55 +40,35 @@ def aggregate_color_share(input_csv_path, output_path):
             "spdde": (215/255, 31/255, 29/255)   
         }
 
-        plt.figure(figsize=(10, 6))
-        for party in result['Partei'].unique():
-            party_data = result[result['Partei'] == party]
-            party_data['Anzahl der Posts'] = party_data['Anzahl der Posts'].rolling(window=10, center=True).mean()
+        # Glättung für alle Parteien zugleich, das Zeichnen übernimmt plot_rendering
+        smoothed = cube.smoothed(counts, window=window)
+        smoothed_cumulative = cube.smoothed(cumulative, window=window_cumulative)
+        periods = counts.index.astype(str).to_numpy()
+        series = []
+        series_cumulative = []
+        for party in cube.parties:
             color = party_colors.get(party, (0, 0, 0))  # Standardfarbe Schwarz, falls nicht definiert
-            plt.plot(party_data['Monat'], party_data['Anzahl der Posts'], label=party, color=color)
-
-        plt.xlabel('Monat')
-        plt.ylabel('Anzahl der Posts')
-        plt.title('Anzahl der Posts pro Partei über die Zeit (geglättet)')
-        plt.legend()
+            series.append((party, periods, smoothed[party].to_numpy(), color))
+            series_cumulative.append((party, periods, smoothed_cumulative[party].to_numpy(), color))
 
+        selected_ticks = list(periods[::6])  # Select every 6th period
         # Gitternetz hinzufügen
-        plt.grid(which='major', linestyle='--', linewidth=0.5, alpha=0.7)
-
-
-        all_ticks = result['Monat'].unique()
-        selected_ticks = all_ticks[::6]  # Select every 6th month
-        plt.xticks(ticks=selected_ticks, labels=selected_ticks, rotation=45)
-
-        plt.tight_layout()
-
-        plt.savefig(output_path_plot)
-        print(f"Das Diagramm der Anzahl der Posts wurde erfolgreich erstellt: {output_path_plot}")
-
-        plt.figure(figsize=(10, 6))
-        for party in result['Partei'].unique():
-            party_data = result[result['Partei'] == party]
-            party_data['Kumulative Anzahl'] = party_data['Kumulative Anzahl'].rolling(window=3, center=True).mean()
-            color = party_colors.get(party, (0, 0, 0))  # Standardfarbe Schwarz, falls nicht definiert
-            plt.plot(party_data['Monat'], party_data['Kumulative Anzahl'], label=party, color=color)
-
-        plt.xlabel('Monat')
-        plt.ylabel('Kumulative Anzahl der Posts')
-        plt.title('Kumulative Anzahl der Posts pro Partei über die Zeit (geglättet)')
-        plt.legend()
-
-        plt.grid(which='major', linestyle='--', linewidth=0.5, alpha=0.7)
-
-        plt.xticks(ticks=selected_ticks, labels=selected_ticks, rotation=45)
+        grid = dict(which='major', linestyle='--', linewidth=0.5, alpha=0.7)
 
-        plt.tight_layout()
+        render(render_pool, render_party_lines, output_path_plot, series,
+               granularity, 'Anzahl der Posts', 'Anzahl der Posts pro Partei über die Zeit (geglättet)',
+               ticks=(selected_ticks, selected_ticks, 45), grid=grid,
+               message=f"Das Diagramm der Anzahl der Posts wurde erfolgreich erstellt: {output_path_plot}")
 
-        plt.savefig(output_path_plot_cumulative)
-        print(f"Das Diagramm der kumulativen Anzahl der Posts wurde erfolgreich erstellt: {output_path_plot_cumulative}")
+        render(render_pool, render_party_lines, output_path_plot_cumulative, series_cumulative,
+               granularity, 'Kumulative Anzahl der Posts', 'Kumulative Anzahl der Posts pro Partei über die Zeit (geglättet)',
+               ticks=(selected_ticks, selected_ticks, 45), grid=grid,
+               message=f"Das Diagramm der kumulativen Anzahl der Posts wurde erfolgreich erstellt: {output_path_plot_cumulative}")
 
     except Exception as e:
         print(f"Ein Fehler ist aufgetreten: {e}")
 
-input_csv_path = r"C:\\Users\\pasol\\Pictures\\Database_CulturalAnalytics\\02_Processed\\result.csv"
-output_path = r"C:\\Users\\pasol\\Pictures\\Database_CulturalAnalytics\\03_Analytics\\02_AggregatedPostsTime"
-aggregate_color_share(input_csv_path, output_path)
+if __name__ == "__main__":
+    input_csv_path = r"C:\\Users\\pasol\\Pictures\\Database_CulturalAnalytics\\02_Processed\\result.csv"
+    output_path = r"C:\\Users\\pasol\\Pictures\\Database_CulturalAnalytics\\03_Analytics\\02_AggregatedPostsTime"
+    aggregate_color_share(input_csv_path, output_path)
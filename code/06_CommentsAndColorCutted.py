@@ -1,14 +1,13 @@
-import pandas as pd
 import os
-import matplotlib.pyplot as plt
-import numpy as np
-from scipy import stats
+from plot_rendering import render_engagement_plot, DENSITY_BINS
+from dataset import load_dataset
+from engagement_stats import trim_engagement, engagement_statistics, correlation_inference, RESAMPLES
 
-def plot_comments_vs_color_share(input_csv_path, output_path):
+def plot_comments_vs_color_share(input_csv_path, output_path, df=None, render_pool=None, inference=False, resamples=RESAMPLES, seed=0,
+                                 plot_mode="auto", bins=DENSITY_BINS):
     try:
-        df = pd.read_csv(input_csv_path)
-
-        df['Datum'] = pd.to_datetime(df['Datum'])
+        # Der Runner übergibt einen bereits geladenen Datensatz
+        df = load_dataset(input_csv_path) if df is None else df
 
         party_colors = {
             "afd.bund": (0/255, 33/255, 200/255),  
@@ -20,58 +19,50 @@ def plot_comments_vs_color_share(input_csv_path, output_path):
             "spdde": (215/255, 31/255, 29/255)   
         }
 
-        for party in df['Partei'].unique():
-            party_data = df[df['Partei'] == party]
-
-            # Remove rows with Farbanteil <= 0.1
-            party_data = party_data[party_data['Farbanteil'] > 0.1]
+        # Filterung, Quantil-Schnitt, Regression und Korrelationen für alle Parteien in einem Durchgang
+        trimmed = trim_engagement(df, metrics=['Kommentare'])
+        # Optional Permutations-p-Werte und Bootstrap-Intervalle (reproduzierbar über seed)
+        if inference:
+            statistics = correlation_inference(trimmed, resamples=resamples, seed=seed).set_index('Partei')
+        else:
+            statistics = engagement_statistics(trimmed).set_index('Partei')
+        party_groups = dict(list(trimmed.groupby('Partei', observed=True)))
 
-            lower_percentile = party_data['Kommentare'].quantile(0.05)
-            upper_percentile = party_data['Kommentare'].quantile(0.95)
-            party_data_filtered = party_data[(party_data['Kommentare'] > lower_percentile) & (party_data['Kommentare'] < upper_percentile)]
+        for party, row in statistics.iterrows():
+            party_data_filtered = party_groups[party]
 
             color = party_colors.get(party, (0, 0, 0))  
 
-            plt.figure(figsize=(10, 6))
-            plt.scatter(party_data_filtered['Farbanteil'], party_data_filtered['Kommentare'], label=party, color=color, alpha=0.6)
-
-            x = party_data_filtered['Farbanteil']
-            y = party_data_filtered['Kommentare']
-            slope, intercept = np.polyfit(x, y, 1)  # Linear regression: y = mx + b
-
-
-            plt.plot(x, slope * x + intercept, color='black', linestyle='-', linewidth=2, label='Regressionslinie')
-
-            pearson_corr = np.corrcoef(x, y)[0, 1]
-            spearman_corr, _ = stats.spearmanr(x, y)
-
-
-            plt.xlabel('Farbanteil')
-            plt.ylabel('Kommentare')
-            plt.title(f'Kommentare vs Farbanteil für {party} (Farbanteil > 0.1)')
-            
-            text_annotation = (
-                f"Pearson-Korrelationskoeffizient: {pearson_corr:.2f}\n"
-                f"Spearman-Korrelationskoeffizient: {spearman_corr:.2f}"
-            )
-            plt.text(0.05, 0.95, text_annotation, fontsize=10, transform=plt.gca().transAxes, 
-                     verticalalignment='top', bbox=dict(boxstyle="round", alpha=0.5, facecolor="white"))
-
-
-            plt.legend()
-            plt.grid(True)
+            x = party_data_filtered['Farbanteil'].to_numpy(dtype=float)
+            y = party_data_filtered['Wert'].to_numpy(dtype=float)
+            slope, intercept = row['Steigung'], row['Achsenabschnitt']  # Linear regression: y = mx + b
+            pearson_corr, spearman_corr = row['Pearson'], row['Spearman']
+
+            if not inference:
+                text_annotation = (
+                    f"Pearson-Korrelationskoeffizient: {pearson_corr:.2f}\n"
+                    f"Spearman-Korrelationskoeffizient: {spearman_corr:.2f}"
+                )
+            else:
+                text_annotation = (
+                    f"Pearson-Korrelationskoeffizient: {pearson_corr:.2f} "
+                    f"(p = {row['Pearson_p']:.4f}, 95%-KI [{row['Pearson_KI_unten']:.2f}, {row['Pearson_KI_oben']:.2f}])\n"
+                    f"Spearman-Korrelationskoeffizient: {spearman_corr:.2f} "
+                    f"(p = {row['Spearman_p']:.4f}, 95%-KI [{row['Spearman_KI_unten']:.2f}, {row['Spearman_KI_oben']:.2f}])\n"
+                    f"Steigung: {slope:.1f} (95%-KI [{row['Steigung_KI_unten']:.1f}, {row['Steigung_KI_oben']:.1f}])"
+                )
 
             output_path_plot = os.path.join(output_path, f"{party}_CommentsAndColor_with_regression_cutted.jpg")
-            plt.tight_layout()
-            plt.savefig(output_path_plot)
-            print(f"Das Diagramm für {party} wurde erfolgreich erstellt: {output_path_plot}")
-
-            plt.close()
+            # Bei vielen Posts Dichteraster statt einzelner Punkte (plot_mode "auto", "scatter" oder "density")
+            render_engagement_plot(render_pool, plot_mode, output_path_plot, x, y, party, color, slope, intercept,
+                                   text_annotation, 'Farbanteil', 'Kommentare', f'Kommentare vs Farbanteil für {party} (Farbanteil > 0.1)',
+                                   message=f"Das Diagramm für {party} wurde erfolgreich erstellt: {output_path_plot}", bins=bins)
 
     except Exception as e:
         print(f"Ein Fehler ist aufgetreten: {e}")
 
 
-input_csv_path = r"C:\\Users\\pasol\\Pictures\\Database_CulturalAnalytics\\02_Processed\\result.csv"
-output_path = r"C:\\Users\\pasol\\Pictures\\Database_CulturalAnalytics\\03_Analytics\\06_CommentsAndColorCutted"
-plot_comments_vs_color_share(input_csv_path, output_path)
+if __name__ == "__main__":
+    input_csv_path = r"C:\\Users\\pasol\\Pictures\\Database_CulturalAnalytics\\02_Processed\\result.csv"
+    output_path = r"C:\\Users\\pasol\\Pictures\\Database_CulturalAnalytics\\03_Analytics\\06_CommentsAndColorCutted"
+    plot_comments_vs_color_share(input_csv_path, output_path)
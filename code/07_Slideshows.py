@@ -1,33 +1,41 @@
 import pandas as pd
+import numpy as np
 import os
-import matplotlib.pyplot as plt
+from plot_rendering import render, render_party_lines
+from dataset import load_dataset, iter_dataset_chunks
+from carousel_analytics import CarouselEngine
 
-def analyse_farbanteile(input_csv, output_csv):
-    df = pd.read_csv(input_csv)
-    
-    df_slideshow = df[df["Slideshow"] == 1]
-    
-    parteien = df_slideshow["Partei"].unique()
-    ergebnisse = []
-    
-    for partei in parteien:
-        partei_df = df_slideshow[df_slideshow["Partei"] == partei]
-        
-        # Mittelwerte der Farbanteile pro Slide-Position berechnen (1-10)
-        farbanteile = []
-        for i in range(1, 11):
-            mittelwert = partei_df[partei_df["Slide"] == i]["Farbanteil"].mean()
-            farbanteile.append(round(mittelwert, 3) if not pd.isna(mittelwert) else 0)
-        
-        # Durchschnittlicher Farbanteil der Bilder ab Position 2 bis 10
-        relevante_werte = [x for x in farbanteile[1:] if x != 0]
-        mittelwert_2_10 = round(sum(relevante_werte) / len(relevante_werte), 3) if relevante_werte else 0
-        
-        ergebnisse.append([partei] + farbanteile + [mittelwert_2_10])
-    
-    spalten = [f"Slide_{i}" for i in range(1, 11)] + ["Durchschnitt_2_10"]
-    df_output = pd.DataFrame(ergebnisse, columns=["Partei"] + spalten)
-    
+# Slide-Positionen, die mindestens ausgegeben werden und in Durchschnitt_2_10 eingehen;
+# längere Karussells ergänzen weitere Spalten
+SLIDE_POSITIONS = list(range(1, 11))
+
+def analyse_farbanteile(input_csv, output_csv, df=None, render_pool=None, chunksize=None):
+    if chunksize:
+        # Streaming: result.csv stückweise lesen und nur die ganzzahligen Zwischenstände der Karussells behalten
+        engine = CarouselEngine.from_chunks(iter_dataset_chunks(input_csv, chunksize))
+    else:
+        # Der Runner übergibt einen bereits geladenen Datensatz
+        df = load_dataset(input_csv) if df is None else df
+        engine = CarouselEngine.from_frame(df)
+
+    # Mittelwerte der Farbanteile pro Slide-Position, fehlende Positionen als 0
+    mittelwerte = engine.position_means(len(SLIDE_POSITIONS)).round(3)
+    positionen = list(mittelwerte.columns)
+
+    # Durchschnittlicher Farbanteil der Bilder ab Position 2 bis 10
+    relevante_werte = mittelwerte[SLIDE_POSITIONS[1:]]
+    durchschnitt = relevante_werte.where(relevante_werte != 0).mean(axis=1).round(3).fillna(0)
+
+    spalten = [f"Slide_{i}" for i in positionen] + ["Durchschnitt_2_10"]
+    df_output = pd.DataFrame(np.column_stack([mittelwerte.to_numpy(), durchschnitt.to_numpy()]),
+                             columns=spalten, index=pd.Index(mittelwerte.index, name="Partei")).reset_index()
+
+    # Kennzahlen pro Karussell und deren Pivot pro Partei (erste Slide gegenüber dem Rest, Verlauf über die Slides)
+    output_path_carousels = os.path.join(output_csv, "Karussells.csv")
+    engine.carousels().round(4).to_csv(output_path_carousels, index=False)
+    output_path_summary = os.path.join(output_csv, "Karussell_Kennzahlen.csv")
+    engine.summary().round(4).to_csv(output_path_summary, index=False)
+    print(f"Karussell-Kennzahlen gespeichert unter: {output_path_summary}")
 
     output_path_csv = os.path.join(output_csv, "CSV.csv")
     df_output.to_csv(output_path_csv, index=False)
@@ -43,22 +51,18 @@ def analyse_farbanteile(input_csv, output_csv):
         "spdde": (215/255, 31/255, 29/255)   
     }
     
-    plt.figure(figsize=(12, 6))
+    series = []
     for index, row in df_output.iterrows():
         partei = row["Partei"]
         color = party_colors.get(partei, (0, 0, 0))  # Standardfarbe schwarz, falls nicht definiert
-        plt.plot(range(1, 11), row[spalten[:-1]], marker="o", label=partei, color=color)
-    
-    plt.xlabel("Slide-Position")
-    plt.ylabel("Durchschnittlicher Farbanteil")
-    plt.title("Verlauf der Farbanteile in Karussell-Posts")
-    plt.xticks(range(1, 11))
-    plt.legend(title="Partei")
-    plt.grid(True)
+        series.append((partei, positionen, row[spalten[:-1]].to_numpy(dtype=float), color))
     
     output_plot_path = os.path.join(output_csv, "Farbanteile_Slides.png")
-    plt.savefig(output_plot_path, dpi=300, bbox_inches='tight')
-    print(f"Plot gespeichert unter: {output_plot_path}")
+    render(render_pool, render_party_lines, output_plot_path, series,
+           "Slide-Position", "Durchschnittlicher Farbanteil", "Verlauf der Farbanteile in Karussell-Posts",
+           ticks=(positionen, None, None), grid=dict(visible=True), figsize=(12, 6), marker="o",
+           legend_title="Partei", tight_layout=False, savefig_kwargs=dict(dpi=300, bbox_inches='tight'),
+           message=f"Plot gespeichert unter: {output_plot_path}")
     
 
 if __name__ == "__main__":
@@ -0,0 +1,165 @@
+import io
+import os
+import numpy as np
+import pandas as pd
+from dataset import apply_column_dtypes
+
+# Zeitliche Auflösungen des Würfels: Spaltenname in den Ausgaben und pandas-Periodenkürzel
+GRANULARITIES = {
+    "Tag": "D",
+    "Woche": "W",
+    "Monat": "M",
+    "Quartal": "Q",
+}
+
+# Farbanteile werden in 02_csv.py auf vier Nachkommastellen gerundet und lassen sich daher exakt als
+# Ganzzahlen in Einheiten von 10^-4 aufsummieren, unabhängig von der Reihenfolge der Teilsummen
+VALUE_DECIMALS = 4
+
+CUBE_STATE_FILE = ".cube_state.pkl"
+# Länge des zuletzt gelesenen Stücks, an dem erkannt wird, ob result.csv nur verlängert wurde
+TAIL_BYTES = 256
+
+class AggregationCube:
+    """
+    Dichter Partei x Zeitraum-Würfel mit Summe und Anzahl eines Werts (standardmäßig Farbanteil) pro Zelle.
+    Intern breit gespeichert (Zeilen: PeriodIndex ohne Lücken, Spalten: Parteien), daraus werden Mittelwert,
+    Anzahl und kumulative Anzahl abgeleitet; Glättungen laufen als ein rolling über alle Parteien zugleich.
+    Summen und Anzahlen mehrerer Würfel lassen sich mit combine zusammenführen.
+
+    """
+    def __init__(self, sums, counts, granularity="Monat", decimals=VALUE_DECIMALS):
+        self.granularity = granularity
+        self.decimals = decimals
+        self.sums = sums
+        self.counts = counts
+
+    @classmethod
+    def from_frame(cls, df, granularity="Monat", value_column="Farbanteil", date_column="Datum",
+                   decimals=VALUE_DECIMALS):
+        freq = GRANULARITIES[granularity]
+        periods = df[date_column].dt.to_period(freq)
+        values = df[value_column].astype(float)
+        if decimals is not None:
+            values = pd.Series(np.rint(values.to_numpy() * 10 ** decimals).astype(np.int64), index=df.index)
+        grouped = values.groupby([df['Partei'].astype(str), periods])
+
+        sums = grouped.sum().unstack(level=0)
+        counts = grouped.size().unstack(level=0)
+        return cls(sums, counts, granularity, decimals).densify()
+
+    @classmethod
+    def from_chunks(cls, chunks, granularity="Monat", value_column="Farbanteil", date_column="Datum",
+                    decimals=VALUE_DECIMALS):
+        # Teilwürfel pro Chunk aufbauen und sofort zusammenführen; im Speicher liegt immer nur ein Chunk
+        cube = None
+        for chunk in chunks:
+            chunk_cube = cls.from_frame(chunk, granularity, value_column, date_column, decimals)
+            cube = chunk_cube if cube is None else cube.combine(chunk_cube)
+        return cube
+
+    def densify(self):
+        # Lückenlose Zeitachse vom ersten bis zum letzten Zeitraum über alle Parteien; leere Zellen sind 0
+        index = self.counts.index
+        full_index = pd.period_range(index.min(), index.max(), freq=index.freq, name=self.granularity)
+        parties = sorted(self.counts.columns.astype(str))
+        sum_dtype = np.int64 if self.decimals is not None else float
+        self.sums = self.sums.reindex(index=full_index, columns=parties).fillna(0).astype(sum_dtype)
+        self.counts = self.counts.reindex(index=full_index, columns=parties).fillna(0).astype(np.int64)
+        self.sums.columns.name = self.counts.columns.name = "Partei"
+        return self
+
+    def combine(self, other):
+        # Summen und Anzahlen zweier Würfel gleicher Auflösung addieren (Vereinigung der Zeiträume und Parteien)
+        if other.granularity != self.granularity or other.decimals != self.decimals:
+            raise ValueError("Würfel mit unterschiedlicher Auflösung lassen sich nicht zusammenführen")
+        sums = self.sums.add(other.sums, fill_value=0)
+        counts = self.counts.add(other.counts, fill_value=0)
+        return AggregationCube(sums, counts, self.granularity, self.decimals).densify()
+
+    @property
+    def parties(self):
+        return list(self.counts.columns)
+
+    def mean(self):
+        # Zeiträume ohne Bilder haben den Mittelwert 0, wie bisher in 03
+        sums = self.sums if self.decimals is None else self.sums / 10 ** self.decimals
+        return (sums / self.counts.where(self.counts > 0)).fillna(0)
+
+    def count(self):
+        return self.counts
+
+    def cumulative(self):
+        return self.counts.cumsum()
+
+    def measure(self, name):
+        return {"mean": self.mean, "count": self.count, "cumulative": self.cumulative}[name]()
+
+    def smoothed(self, values, window, center=True):
+        # Gleitender Mittelwert aller Parteien in einem Aufruf (spaltenweise)
+        return values.rolling(window=window, center=center).mean()
+
+    def to_long(self, columns):
+        """
+        Langes Format für die CSV-Ausgaben: eine Zeile pro Partei und Zeitraum, columns ordnet
+        Spaltennamen breiten Tabellen (z. B. cube.mean()) zu.
+
+        """
+        index = pd.MultiIndex.from_product([self.parties, self.counts.index.astype(str)],
+                                           names=["Partei", self.granularity])
+        long_df = pd.DataFrame({
+            name: values[self.parties].to_numpy().T.ravel() for name, values in columns.items()
+        }, index=index)
+        return long_df.reset_index()
+
+def update_cube(input_csv_path, state_folder, granularity="Monat"):
+    """
+    Inkrementelle Variante von AggregationCube.from_frame für eine nur angehängte result.csv: Der Würfel wird mit dem
+    gelesenen Byte-Offset in state_folder gespeichert, beim nächsten Aufruf werden nur die neuen Zeilen gelesen und
+    eingerechnet. Ist die CSV kürzer geworden oder hat sich das zuletzt gelesene Stück verändert, wird neu aufgebaut.
+    Gibt den Würfel und die Zeiträume zurück, die neue Zeilen erhalten haben (None bei vollständigem Neuaufbau).
+
+    """
+    state_path = os.path.join(state_folder, CUBE_STATE_FILE)
+    state = pd.read_pickle(state_path) if os.path.exists(state_path) else None
+
+    with open(input_csv_path, "rb") as csv_file:
+        header = csv_file.readline()
+        size = os.fstat(csv_file.fileno()).st_size
+
+        if state is not None and state["granularity"] == granularity and state["header"] == header \
+                and state["offset"] <= size:
+            # Das Ende des bereits gelesenen Bereichs muss unverändert sein, sonst wurde die Datei umgeschrieben
+            csv_file.seek(state["offset"] - len(state["tail"]))
+            if csv_file.read(len(state["tail"])) == state["tail"]:
+                new_bytes = csv_file.read()
+                # Nur vollständige Zeilen übernehmen, eine halb geschriebene letzte Zeile folgt beim nächsten Lauf
+                new_bytes = new_bytes[:new_bytes.rfind(b"\n") + 1]
+                cube = state["cube"]
+                affected = []
+                if new_bytes:
+                    new_rows = apply_column_dtypes(pd.read_csv(io.BytesIO(header + new_bytes)))
+                    new_cube = AggregationCube.from_frame(new_rows, granularity)
+                    cube = cube.combine(new_cube)
+                    affected = list(new_cube.counts.index[new_cube.counts.sum(axis=1) > 0].astype(str))
+                save_cube_state(state_path, cube, header, state["offset"] + len(new_bytes),
+                                (state["tail"] + new_bytes)[-TAIL_BYTES:])
+                return cube, affected
+
+        csv_file.seek(0)
+        content = csv_file.read()
+
+    content = content[:content.rfind(b"\n") + 1]
+    cube = AggregationCube.from_frame(apply_column_dtypes(pd.read_csv(io.BytesIO(content))), granularity)
+    save_cube_state(state_path, cube, header, len(content), content[-TAIL_BYTES:])
+    return cube, None
+
+def save_cube_state(state_path, cube, header, offset, tail):
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    pd.to_pickle({
+        "granularity": cube.granularity,
+        "cube": cube,
+        "header": header,
+        "offset": offset,
+        "tail": tail,
+    }, state_path)
@@ -0,0 +1,378 @@
+import os
+import sys
+import csv
+import lzma
+import json
+import time
+import shutil
+import sqlite3
+import tracemalloc
+import importlib
+import contextlib
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+# Die Pipeline-Skripte beginnen mit einer Ziffer und werden über importlib geladen
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import post_index
+from post_index import METADATA_DATABASE
+from dataset import load_dataset
+from engagement_stats import trim_engagement, engagement_statistics
+
+# Ziel-RGB-Werte wie in 02_csv.py
+PARTY_PALETTES = {
+    "afd.bund" : [(19,155,217),(254,0,0),(226,1,1),(3,70,122),(90,204,255)],
+    "cdu" : [(82,183,193),(63,137,198),(249,180,0),(225,0,24)],
+    "csu" : [(154,201,21),(33,131,206),(19,230,249),(0,125,184),(16,228,249),(72,199,240),(117,184,255),(36,180,145),(214,249,23)],
+    "die_gruenen" : [(255,239,38),(74,150,41),(230,0,126),(158,200,102),(18,96,50),(255,241,122),(139,188,37),(0,137,57)],
+    "dielinke" : [(226,6,18),(79,187,199),(112,0,59),(232,78,68)],
+    "fdp" : [(254,237,1),(0,159,227),(227,1,126),(166,2,125),(254,138,173)],
+    "spdde" : [(224,0,26),(255,89,49),(166,26,1)]
+}
+
+# Zeilenzahl der ursprünglichen result.csv, Basis für die Skalierung 1x / 10x / 100x
+BASE_ROWS = 28424
+DELTA = 40
+
+class SkipRendering:
+    # Render-Pool, der Abbildungen verwirft: gemessen wird nur die Berechnung der Analysen
+    def submit(self, render_function, *args, **kwargs):
+        pass
+
+def measure(results, stage, scale, count, unit, function, *args, **kwargs):
+    """
+    Führt eine Stufe aus und hält Laufzeit, Durchsatz und Spitzenspeicher fest. Der Spitzenspeicher stammt aus tracemalloc
+    und umfasst die Python- und NumPy-Allokationen des Hauptprozesses (nicht die von Worker-Prozessen).
+    Die Konsolenausgaben der Stufe werden verworfen.
+
+    """
+    tracemalloc.start()
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        result = function(*args, **kwargs)
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    results.append({
+        "Stufe": stage,
+        "Skalierung": scale,
+        "Anzahl": count,
+        "Einheit": unit,
+        "Sekunden": round(seconds, 3),
+        "Durchsatz pro s": round(count / seconds, 1) if seconds > 0 else None,
+        "Spitzenspeicher MB": round(peak / 2 ** 20, 1),
+        "Referenz": None,
+    })
+    return result
+
+def record_check(results, passed):
+    results[-1]["Referenz"] = "ok" if passed else "ABWEICHUNG"
+
+# --- Synthetische Rohdaten im Instaloader-Format ---
+
+def synthetic_image(rng, size, palette):
+    """
+    Bild mit weichem Farbverlauf, einigen Flächen in (leicht verrauschten) Parteifarben und Bildrauschen.
+    Ergibt JPEG-Größen in der Größenordnung echter Instagram-Bilder.
+
+    """
+    width, height = size
+    start, end = rng.integers(0, 256, (2, 3))
+    ramp = np.linspace(0, 1, width)[None, :, None]
+    image = (start + (end - start) * ramp).repeat(height, axis=0)
+
+    for _ in range(rng.integers(1, 6)):
+        color = np.array(palette[rng.integers(len(palette))])
+        x0, y0 = rng.integers(0, width // 2), rng.integers(0, height // 2)
+        x1, y1 = x0 + rng.integers(width // 10, width // 2), y0 + rng.integers(height // 10, height // 2)
+        image[y0:y1, x0:x1] = color + rng.integers(-15, 16, 3)
+
+    image = image + rng.normal(0, 6, image.shape)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+def generate_raw_profile(profile_folder, palette, posts, image_size=(1080, 1080), png_share=0.1, seed=0):
+    """
+    Schreibt Posts wie ein Instaloader-Download in den raw-Ordner des Profils: Bilder als .jpg oder .png
+    (Karussells mit _1, _2, ...) und Metadaten als .json.xz. Gibt die erwarteten Likes/Kommentare pro Post zurück.
+
+    """
+    rng = np.random.default_rng(seed)
+    raw_folder = os.path.join(profile_folder, "raw")
+    os.makedirs(raw_folder, exist_ok=True)
+
+    metadata = {}
+    end_date = datetime(2024, 12, 18)
+    for index in range(posts):
+        name = (end_date - index * timedelta(hours=20)).strftime("%Y-%m-%d_%H-%M-%S_UTC")
+        slides = int(rng.choice([1, 1, 1, 2, 3, 5]))
+        for slide in range(1, slides + 1):
+            suffix = f"_{slide}" if slides > 1 else ""
+            extension = "png" if rng.random() < png_share else "jpg"
+            Image.fromarray(synthetic_image(rng, image_size, palette)).save(os.path.join(raw_folder, f"{name}{suffix}.{extension}"))
+
+        likes, comments = int(rng.integers(0, 20000)), int(rng.integers(0, 2000))
+        metadata[name] = (likes, comments)
+        data = {"node": {"edge_media_preview_like": {"count": likes}, "comments": comments, "shortcode": f"B{index:09d}"}}
+        with lzma.open(os.path.join(raw_folder, name + ".json.xz"), "wt", encoding="utf-8") as compressed_file:
+            json.dump(data, compressed_file)
+    return metadata
+
+# --- Synthetische result.csv ---
+
+def generate_result_csv(output_csv_path, rows, seed=0):
+    # Zeilen im Format von result.csv mit plausiblen Verteilungen (Karussells, Likes, Farbanteile)
+    rng = np.random.default_rng(seed)
+    parties = np.array(list(PARTY_PALETTES))
+    start = np.datetime64("2014-02-01T00:00:00")
+    seconds = rng.integers(0, int((np.datetime64("2024-12-18") - start) / np.timedelta64(1, "s")), rows)
+    timestamps = pd.to_datetime(start + seconds.astype("timedelta64[s]"))
+
+    slideshow = (rng.random(rows) < 0.35).astype(int)
+    slide = np.where(slideshow == 1, rng.integers(1, 11, rows), 1)
+    df = pd.DataFrame({
+        "Partei": parties[rng.integers(0, len(parties), rows)],
+        "Datum": timestamps.strftime("%Y-%m-%d"),
+        "Uhrzeit": timestamps.strftime("%H-%M-%S"),
+        "Slideshow": slideshow,
+        "Slide": slide,
+        "Likes": rng.lognormal(7.5, 1.0, rows).astype(int),
+        "Kommentare": rng.lognormal(4.5, 1.2, rows).astype(int),
+    })
+    df["Dateiname"] = df["Datum"] + "_" + df["Uhrzeit"] + "_UTC" + np.where(slideshow == 1, "_" + df["Slide"].astype(str), "") + ".jpg"
+    df["Farbanteil"] = np.round(rng.beta(0.6, 2.5, rows), 4)
+    df.to_csv(output_csv_path, index=False)
+
+# --- Referenzimplementierungen ---
+
+def reference_color_share(image_path, palette, delta):
+    # Ursprüngliche Maske aus 02_csv.py: ein Vergleich pro Zielfarbe über das ganze Bild
+    image_array = np.array(Image.open(image_path).convert("RGB")).astype(np.int16)
+    mask = np.zeros(image_array.shape[:2], dtype=bool)
+    for target_rgb in palette:
+        mask |= np.all(np.abs(image_array - np.array(target_rgb)) <= delta, axis=-1)
+    return round(mask.sum() / mask.size, 4)
+
+def reference_monthly(df):
+    # Monatliche Mittelwerte und Anzahlen über String-Monate und einen vollständigen Partei x Monat-Index
+    months = pd.to_datetime(df["Datum"]).dt.to_period("M")
+    grouped = df.groupby([df["Partei"].astype(str), months.astype(str)], observed=True)["Farbanteil"]
+    all_months = pd.period_range(months.min(), months.max(), freq="M").astype(str)
+    index = pd.MultiIndex.from_product([sorted(df["Partei"].astype(str).unique()), all_months], names=["Partei", "Monat"])
+    result = pd.DataFrame({"mean": grouped.mean(), "count": grouped.size()}).reindex(index)
+    result["count"] = result["count"].fillna(0).astype(int)
+    result["mean"] = result["mean"].fillna(0)
+    result["cumulative"] = result.groupby(level="Partei")["count"].cumsum()
+    return result.reset_index()
+
+def reference_slide_means(df):
+    slides = df[df["Slideshow"] == 1]
+    return slides.groupby([slides["Partei"].astype(str), "Slide"], observed=True)["Farbanteil"].mean()
+
+def reference_carousel_count(df):
+    return len(df[df["Slideshow"] == 1].groupby(["Partei", "Datum", "Uhrzeit"], observed=True))
+
+def within_rounding(values, reference, decimals):
+    # Gerundete Ausgaben dürfen höchstens eine halbe Einheit der letzten Stelle vom Referenzwert abweichen
+    return bool(np.all(np.abs(np.asarray(values, dtype=float) - np.asarray(reference, dtype=float)) <= 0.5 * 10 ** -decimals + 1e-9))
+
+def check_monthly_color(output_folder, reference):
+    output = pd.read_csv(os.path.join(output_folder, "CSV.csv"))
+    merged = output.merge(reference, on=["Partei", "Monat"], how="outer")
+    return len(merged) == len(output) == len(reference) and within_rounding(merged["durchschnittlicher Farbanteil"], merged["mean"], 4)
+
+def check_monthly_counts(output_folder, reference):
+    output = pd.read_csv(os.path.join(output_folder, "CSV.csv"))
+    merged = output.merge(reference, on=["Partei", "Monat"], how="outer")
+    return len(merged) == len(output) == len(reference) and \
+        (merged["Anzahl der Posts"] == merged["count"]).all() and (merged["Kumulative Anzahl"] == merged["cumulative"]).all()
+
+def check_slide_means(output_folder, reference, carousel_count):
+    output = pd.read_csv(os.path.join(output_folder, "CSV.csv")).set_index("Partei")
+    values, expected = [], []
+    for (party, slide), mean in reference.items():
+        values.append(output.loc[party, f"Slide_{slide}"])
+        expected.append(mean)
+    carousels = pd.read_csv(os.path.join(output_folder, "Karussells.csv"))
+    return within_rounding(values, expected, 3) and len(carousels) == carousel_count
+
+def check_statistics(df, metric):
+    # Statistik-Engine gegen np.polyfit / np.corrcoef pro Partei
+    trimmed = trim_engagement(df, metrics=[metric])
+    table = engagement_statistics(trimmed).set_index("Partei")
+    for party, group in trimmed.groupby("Partei", observed=True):
+        x, y = group["Farbanteil"].to_numpy(dtype=float), group["Wert"].to_numpy(dtype=float)
+        slope, intercept = np.polyfit(x, y, 1)
+        if not np.allclose([table.loc[party, "Steigung"], table.loc[party, "Pearson"]], [slope, np.corrcoef(x, y)[0, 1]], rtol=1e-6):
+            return False
+    return True
+
+# --- Benchmark-Stufen ---
+
+def benchmark_extraction(work_folder, results, posts_per_party=40, image_size=(1080, 1080), png_share=0.1,
+                         workers=1, parties=None, seed=0):
+    """
+    Erzeugt synthetische Profile im raw-Format und misst die Stufen aus 01_instadownload.py (Sortieren inkl.
+    PNG-Umwandlung, Metadaten-Import, Entpacken der .xz Dateien) sowie die Farbanteile aus 02_csv.py.
+
+    """
+    instadownload = importlib.import_module("01_instadownload")
+    extraction = importlib.import_module("02_csv")
+    parties = parties or list(PARTY_PALETTES)
+
+    project_path = os.path.join(work_folder, "project")
+    shutil.rmtree(project_path, ignore_errors=True)
+    database_folder = os.path.join(project_path, "Database")
+
+    expected_metadata = {}
+    for party_index, party in enumerate(parties):
+        profile_folder = os.path.join(database_folder, party)
+        expected_metadata[party] = generate_raw_profile(profile_folder, PARTY_PALETTES[party], posts_per_party,
+                                                        image_size, png_share, seed + party_index)
+
+    profiles = [os.path.join(database_folder, party) for party in parties]
+    raw_files = sum(len(os.listdir(os.path.join(profile, "raw"))) for profile in profiles)
+
+    def sort_all():
+        return {profile: instadownload.sort_files_by_extension(profile, workers) for profile in profiles}
+    moved = measure(results, "sort_files_by_extension", "-", raw_files, "Dateien", sort_all)
+    images = sum(len(filenames) for filenames in moved.values())
+    record_check(results, images == sum(len(os.listdir(os.path.join(profile, "jpg"))) for profile in profiles))
+
+    archives = sum(len(os.listdir(os.path.join(profile, "xz"))) for profile in profiles)
+
+    def ingest_all():
+        for profile in profiles:
+            post_index.register_images(profile, moved[profile])
+            instadownload.ingest_xz_metadata(os.path.join(profile, "xz"), os.path.join(profile, METADATA_DATABASE))
+    measure(results, "ingest_xz_metadata", "-", archives, "Archive", ingest_all)
+    record_check(results, sum(count_metadata_rows(profile) for profile in profiles) == archives)
+
+    def extract_all():
+        for profile in profiles:
+            os.makedirs(os.path.join(profile, "json"), exist_ok=True)
+            instadownload.extract_xz_files(os.path.join(profile, "xz"), os.path.join(profile, "json"))
+    measure(results, "extract_xz_files", "-", archives, "Archive", extract_all)
+    record_check(results, sum(len(os.listdir(os.path.join(profile, "json"))) for profile in profiles) == archives)
+
+    # Einzelbild-Farbanteile gegen die ursprüngliche Maske prüfen
+    sample = [(party, os.path.join(database_folder, party, "jpg", filename))
+              for party in parties for filename in sorted(moved[os.path.join(database_folder, party)])[:10]]
+
+    def color_shares():
+        return [extraction.calculate_color_percentage(path, PARTY_PALETTES[party], None, DELTA, save_overlay=False)
+                for party, path in sample]
+    shares = measure(results, "calculate_color_percentage", "-", len(sample), "Bilder", color_shares)
+    record_check(results, shares == [reference_color_share(path, PARTY_PALETTES[party], DELTA) for party, path in sample])
+
+    measure(results, "create_csv_from_project", "-", images, "Bilder", extraction.create_csv_from_project,
+            project_path, parties, PARTY_PALETTES, overlay_mode="none", deltas=(DELTA,), workers=workers)
+    record_check(results, check_project_csv(project_path, parties, expected_metadata, sample))
+
+def count_metadata_rows(profile_folder):
+    connection = sqlite3.connect(os.path.join(profile_folder, METADATA_DATABASE))
+    count = connection.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+    connection.close()
+    return count
+
+def check_project_csv(project_path, parties, expected_metadata, sample):
+    with open(os.path.join(project_path, "output.csv"), newline="", encoding="utf-8") as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    if len(rows) != sum(len(post_index.list_images(os.path.join(project_path, "Database", party))) for party in parties):
+        return False
+
+    sampled = {(party, os.path.basename(path)): path for party, path in sample}
+    for row in rows:
+        post = row["Dateiname"].split("_UTC")[0] + "_UTC"
+        likes, comments = expected_metadata[row["Partei"]][post]
+        if int(row["Likes"]) != likes or int(row["Kommentare"]) != comments:
+            return False
+        path = sampled.get((row["Partei"], row["Dateiname"]))
+        if path is not None and float(row[f"RGB Anteil Delta {DELTA}"]) != reference_color_share(path, PARTY_PALETTES[row["Partei"]], DELTA):
+            return False
+    return True
+
+def benchmark_analyses(work_folder, results, scales=(1, 10, 100), chunksize=200_000, seed=0):
+    """
+    Misst die Analysen 03-07 auf synthetischen result.csv-Dateien mit dem 1-, 10- und 100-fachen Umfang
+    (03, 04 und 07 zusätzlich im Streaming-Modus) und vergleicht die CSV-Ausgaben mit Referenzberechnungen.
+
+    """
+    color_time = importlib.import_module("03_AggregationColorTime")
+    posts_time = importlib.import_module("04_AggregationPostsTime")
+    likes = importlib.import_module("05_LikesAndColorCutted")
+    comments = importlib.import_module("06_CommentsAndColorCutted")
+    slideshows = importlib.import_module("07_Slideshows")
+    skip = SkipRendering()
+
+    for scale in scales:
+        scale_folder = os.path.join(work_folder, f"result_{scale}x")
+        os.makedirs(scale_folder, exist_ok=True)
+        input_csv_path = os.path.join(scale_folder, "result.csv")
+        rows = BASE_ROWS * scale
+        if not os.path.exists(input_csv_path):
+            generate_result_csv(input_csv_path, rows, seed)
+
+        df = measure(results, "load_dataset", f"{scale}x", rows, "Zeilen", load_dataset, input_csv_path, use_cache=False)
+        reference = reference_monthly(df)
+        slide_reference = reference_slide_means(df)
+        carousel_count = reference_carousel_count(df)
+
+        runs = [
+            ("03_AggregationColorTime", color_time.aggregate_color_share, lambda folder: check_monthly_color(folder, reference)),
+            ("04_AggregationPostsTime", posts_time.aggregate_color_share, lambda folder: check_monthly_counts(folder, reference)),
+            ("05_LikesAndColorCutted", likes.plot_likes_vs_color_share, lambda folder: check_statistics(df, "Likes")),
+            ("06_CommentsAndColorCutted", comments.plot_comments_vs_color_share, lambda folder: check_statistics(df, "Kommentare")),
+            ("07_Slideshows", slideshows.analyse_farbanteile, lambda folder: check_slide_means(folder, slide_reference, carousel_count)),
+        ]
+        for name, analysis, check in runs:
+            output_folder = os.path.join(scale_folder, name)
+            os.makedirs(output_folder, exist_ok=True)
+            measure(results, name, f"{scale}x", rows, "Zeilen", analysis, input_csv_path, output_folder, df=df, render_pool=skip)
+            record_check(results, check(output_folder))
+
+        # Streaming-Modus mit begrenztem Speicher; die Ausgabe muss der In-Memory-Variante genau entsprechen
+        for name, analysis in [
+            ("03_AggregationColorTime", color_time.aggregate_color_share),
+            ("04_AggregationPostsTime", posts_time.aggregate_color_share),
+            ("07_Slideshows", slideshows.analyse_farbanteile),
+        ]:
+            output_folder = os.path.join(scale_folder, name + "_chunks")
+            os.makedirs(output_folder, exist_ok=True)
+            measure(results, name + " (chunks)", f"{scale}x", rows, "Zeilen", analysis, input_csv_path, output_folder,
+                    render_pool=skip, chunksize=chunksize)
+            with open(os.path.join(output_folder, "CSV.csv"), "rb") as streamed, \
+                    open(os.path.join(scale_folder, name, "CSV.csv"), "rb") as in_memory:
+                record_check(results, streamed.read() == in_memory.read())
+
+def run_benchmarks(work_folder, scales=(1, 10, 100), posts_per_party=40, image_size=(1080, 1080), workers=1):
+    """
+    Führt alle Benchmarks offline aus, gibt eine Übersicht aus und schreibt sie als benchmark.csv in work_folder.
+
+    """
+    os.makedirs(work_folder, exist_ok=True)
+    results = []
+    benchmark_extraction(work_folder, results, posts_per_party, image_size, workers=workers)
+    benchmark_analyses(work_folder, results, scales)
+
+    summary = pd.DataFrame(results)
+    summary_path = os.path.join(work_folder, "benchmark.csv")
+    summary.to_csv(summary_path, index=False)
+    print(summary.to_string(index=False))
+    print(f"Benchmark-Ergebnisse gespeichert unter: {summary_path}")
+
+    if (summary["Referenz"] == "ABWEICHUNG").any():
+        print("Warnung: Mindestens eine Stufe weicht von der Referenz ab.")
+    return summary
+
+if __name__ == "__main__":
+    work_folder = r"C:\\Users\\pasol\\Pictures\\Database_CulturalAnalytics\\04_Benchmark"
+
+    # 1x entspricht den 28.424 Zeilen der ursprünglichen result.csv
+    scales = (1, 10, 100)
+    posts_per_party = 40
+    workers = os.cpu_count() or 1
+
+    run_benchmarks(work_folder, scales, posts_per_party, workers=workers)
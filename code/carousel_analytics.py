@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+from aggregation_cube import VALUE_DECIMALS
+
+# Ein Karussell-Post ist durch Partei, Datum und Uhrzeit eindeutig bestimmt
+CAROUSEL_KEYS = ["Partei", "Datum", "Uhrzeit"]
+# Ganzzahlige Teilsummen pro Karussell, aus denen sich alle Kennzahlen ableiten lassen
+PARTIAL_SUMS = ["Slides", "Summe_Position", "Summe_Position_2", "Summe_Farbanteil", "Summe_Position_Farbanteil"]
+
+def add_tables(left, right):
+    # Zellen, die in keiner der beiden Tabellen vorkommen, bleiben nach add leer
+    return left.add(right, fill_value=0).fillna(0).astype(np.int64)
+
+class CarouselEngine:
+    """
+    Kennzahlen der Karussell-Posts aus zwei ganzzahligen Zwischenständen, die mit einem gruppierten Durchlauf
+    entstehen: Summe und Anzahl der Farbanteile pro Partei und Slide-Position (beliebig viele Positionen) und
+    Teilsummen pro Karussell (Anzahl, Summen von Position, Position^2, Farbanteil und Position * Farbanteil sowie
+    Farbanteil der ersten Slide). Beide sind additiv, Teilergebnisse einzelner Chunks oder neu hinzugekommener
+    Zeilen lassen sich daher mit combine exakt zusammenführen, auch wenn ein Karussell über zwei Chunks verteilt ist.
+
+    """
+    def __init__(self, position_sums, position_counts, partials, parties):
+        self.position_sums = position_sums
+        self.position_counts = position_counts
+        self.partials = partials
+        self.parties = parties
+
+    @classmethod
+    def from_frame(cls, df):
+        slides = df[df["Slideshow"] == 1]
+        parties = slides["Partei"].astype(str)
+        positions = slides["Slide"].astype(np.int64)
+        # Farbanteile in Einheiten von 10^-4 wie im Aggregationswürfel, damit die Summen exakt bleiben
+        units = pd.Series(np.rint(slides["Farbanteil"].to_numpy(dtype=float) * 10 ** VALUE_DECIMALS).astype(np.int64),
+                          index=slides.index)
+
+        by_position = units.groupby([parties, positions])
+        position_sums = by_position.sum().unstack(fill_value=0)
+        position_counts = by_position.size().unstack(fill_value=0)
+
+        values = pd.DataFrame({
+            "Partei": parties,
+            "Datum": slides["Datum"],
+            "Uhrzeit": slides["Uhrzeit"].astype(str),
+            "Slides": 1,
+            "Summe_Position": positions,
+            "Summe_Position_2": positions ** 2,
+            "Summe_Farbanteil": units,
+            "Summe_Position_Farbanteil": positions * units,
+            "Erste_Position": positions,
+            "Farbanteil_Erste": units,
+        })
+        partials = cls.reduce_partials(values.set_index(CAROUSEL_KEYS))
+        return cls(position_sums, position_counts, partials, list(pd.unique(parties)))
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """
+        Baut die Engine aus Teilstücken von result.csv. Die Positionssummen (Parteien x Positionen) werden laufend
+        addiert, die Teilsummen pro Karussell nur pro Chunk reduziert und am Ende einmal zusammengeführt; dabei
+        werden nur Karussells neu gruppiert, die in mehreren Chunks vorkommen.
+
+        """
+        position_sums = position_counts = None
+        partials = []
+        parties = []
+        for chunk in chunks:
+            chunk_engine = cls.from_frame(chunk)
+            if position_sums is None:
+                position_sums, position_counts = chunk_engine.position_sums, chunk_engine.position_counts
+            else:
+                position_sums = add_tables(position_sums, chunk_engine.position_sums)
+                position_counts = add_tables(position_counts, chunk_engine.position_counts)
+            partials.append(chunk_engine.partials)
+            parties += [party for party in chunk_engine.parties if party not in parties]
+        if not partials:
+            return None
+        return cls(position_sums, position_counts, cls.merge_partials(partials), parties)
+
+    @staticmethod
+    def reduce_partials(values):
+        # Die erste Slide ist die mit der kleinsten Position, daher vor dem Gruppieren stabil nach Position sortieren
+        values = values.sort_values("Erste_Position", kind="stable")
+        aggregations = {column: "sum" for column in PARTIAL_SUMS}
+        aggregations.update({"Erste_Position": "first", "Farbanteil_Erste": "first"})
+        return values.groupby(level=CAROUSEL_KEYS).agg(aggregations)
+
+    @classmethod
+    def merge_partials(cls, partials):
+        # Bereits reduzierte Teilsummen zusammenführen; nur über Chunk-Grenzen verteilte Karussells neu gruppieren
+        values = pd.concat(partials)
+        split = values.index.duplicated(keep=False)
+        if split.any():
+            values = pd.concat([values[~split], cls.reduce_partials(values[split])])
+        return values.sort_index()
+
+    def combine(self, other):
+        position_sums = add_tables(self.position_sums, other.position_sums)
+        position_counts = add_tables(self.position_counts, other.position_counts)
+        partials = self.merge_partials([self.partials, other.partials])
+        parties = self.parties + [party for party in other.parties if party not in self.parties]
+        return CarouselEngine(position_sums, position_counts, partials, parties)
+
+    def position_means(self, min_positions=0):
+        """
+        Mittlerer Farbanteil pro Partei (Zeilen, in Reihenfolge des ersten Auftretens) und Slide-Position (Spalten),
+        mindestens bis Position min_positions; Positionen ohne Bilder haben den Wert 0.
+
+        """
+        last_position = max([min_positions] + list(self.position_counts.columns))
+        positions = list(range(1, last_position + 1))
+        sums = self.position_sums.reindex(index=self.parties, columns=positions, fill_value=0)
+        counts = self.position_counts.reindex(index=self.parties, columns=positions, fill_value=0)
+        return (sums / 10 ** VALUE_DECIMALS / counts.where(counts > 0)).fillna(0)
+
+    def carousels(self):
+        """
+        Eine Zeile pro Karussell: Anzahl Slides, Farbanteil der ersten Slide, mittlerer Farbanteil der übrigen Slides,
+        deren Differenz und die OLS-Steigung des Farbanteils über die Slide-Position (negativ: Farbe nimmt ab).
+
+        """
+        partials = self.partials
+        scale = 10 ** VALUE_DECIMALS
+        n = partials["Slides"]
+        rest_count = (n - 1).where(n > 1)
+        # Zähler und Nenner der Steigung exakt als Ganzzahlen
+        numerator = n * partials["Summe_Position_Farbanteil"] - partials["Summe_Position"] * partials["Summe_Farbanteil"]
+        denominator = n * partials["Summe_Position_2"] - partials["Summe_Position"] ** 2
+
+        first = partials["Farbanteil_Erste"] / scale
+        rest = (partials["Summe_Farbanteil"] - partials["Farbanteil_Erste"]) / scale / rest_count
+        carousels = pd.DataFrame({
+            "Slides": n,
+            "Farbanteil_Erste": first,
+            "Farbanteil_Rest": rest,
+            "Differenz_Erste_Rest": first - rest,
+            "Steigung": numerator / scale / denominator.where(denominator > 0),
+        }).reset_index()
+        carousels["Datum"] = carousels["Datum"].dt.strftime("%Y-%m-%d")
+        return carousels
+
+    def summary(self):
+        """
+        Pivot pro Partei: Anzahl Karussells, mittlere Länge sowie Mittelwerte von erster Slide, übrigen Slides,
+        deren Differenz und der Steigung über alle Karussells mit mindestens zwei Slides.
+
+        """
+        carousels = self.carousels()
+        grouped = carousels.groupby("Partei")
+        summary = pd.DataFrame({
+            "Karussells": grouped.size(),
+            "Slides_Mittel": grouped["Slides"].mean(),
+        })
+        multi_slide = carousels[carousels["Slides"] > 1].groupby("Partei")
+        for column in ("Farbanteil_Erste", "Farbanteil_Rest", "Differenz_Erste_Rest", "Steigung"):
+            summary[column] = multi_slide[column].mean()
+        return summary.reindex(self.parties).reset_index()
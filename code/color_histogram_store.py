@@ -0,0 +1,274 @@
+import os
+import csv
+import sys
+import json
+import importlib
+from PIL import Image
+import numpy as np
+
+# 02_csv.py beginnt mit einer Ziffer und wird daher über importlib geladen
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+csv_stage = importlib.import_module("02_csv")
+
+# Bits pro Farbkanal im quantisierten Rest-Histogramm (4 Bit = 16^3 = 4096 Bins). Für den Rest gilt die Annahme
+# gleichverteilter Farben im Bin: bei flächigen Grafiken liegt der Fehler dank der exakten Farben meist unter 0.005,
+# bei verrauschten Flächen nahe der Delta-Grenze (synthetische Bilder aus benchmark.py) im Mittel unter 0.001,
+# im Einzelfall aber bis etwa 0.02. report_store_error misst den Fehler für den eigenen Bestand.
+HISTOGRAM_BITS = 4
+# Farben mit mindestens diesem Pixelanteil (und mindestens EXACT_MIN_PIXELS Pixeln) werden exakt gespeichert.
+# Flächige Grafiken bestehen fast nur aus wenigen solchen Farben; liegen sie in einem Bin am Rand des Deltas,
+# wäre die Annahme gleichverteilter Farben im Bin dort besonders falsch.
+EXACT_MIN_SHARE = 0.0001
+EXACT_MIN_PIXELS = 16
+# Schlüssel unterhalb dieser Grenze sind exakte 24-Bit-Farben, darüber Bins des Rest-Histogramms
+EXACT_KEYS = 1 << 24
+
+STORE_FORMAT = {"version": 2, "bits": HISTOGRAM_BITS, "exact_min_share": EXACT_MIN_SHARE, "exact_min_pixels": EXACT_MIN_PIXELS}
+INDEX_HEADER = ["Partei", "Dateiname", "Start", "Ende", "Pixel", "Bytes", "Mtime_ns"]
+
+def histogram_bins(bits):
+    return 1 << (3 * bits)
+
+def calculate_color_histogram(image_path, bits=HISTOGRAM_BITS):
+    """
+    Berechnet das dünn besetzte Farb-Histogramm eines Bildes als ganzzahlige Pixelzahlen: häufige Farben exakt
+    (Schlüssel = 24-Bit-RGB), alle übrigen in Bins mit bits Bits pro Kanal (Schlüssel = EXACT_KEYS + Bin).
+    Gibt Schlüssel, Pixelzahlen (beide uint32, nur Einträge ungleich 0) und die Gesamtzahl der Pixel zurück.
+
+    """
+    image = Image.open(image_path)
+    image = image.convert('RGB')
+    image_array = np.array(image)
+
+    packed = image_array[..., 0].astype(np.uint32) << 16
+    packed |= image_array[..., 1].astype(np.uint32) << 8
+    packed |= image_array[..., 2]
+    colors, counts = np.unique(packed.ravel(), return_counts=True)
+    pixel_count = packed.size
+
+    exact = counts >= max(EXACT_MIN_PIXELS, EXACT_MIN_SHARE * pixel_count)
+    rest_colors = colors[~exact]
+    shift = 8 - bits
+    rest_bins = ((rest_colors >> 16) >> shift) << (2 * bits)
+    rest_bins |= (((rest_colors >> 8) & 255) >> shift) << bits
+    rest_bins |= (rest_colors & 255) >> shift
+    rest_counts = np.bincount(rest_bins, weights=counts[~exact], minlength=histogram_bins(bits))
+    occupied = np.flatnonzero(rest_counts)
+
+    keys = np.concatenate([colors[exact], EXACT_KEYS + occupied]).astype(np.uint32)
+    key_counts = np.concatenate([counts[exact], rest_counts[occupied]]).astype(np.uint32)
+    return keys, key_counts, pixel_count
+
+def load_store_index(store_folder):
+    # (Partei, Dateiname) -> Eintrag der index.csv; leer, wenn der Speicher fehlt oder ein anderes Format hat
+    format_path = os.path.join(store_folder, "store.json")
+    if not os.path.exists(format_path):
+        return {}
+    with open(format_path, "r", encoding="utf-8") as format_file:
+        if json.load(format_file) != STORE_FORMAT:
+            return {}
+
+    index = {}
+    with open(os.path.join(store_folder, "index.csv"), newline='', encoding='utf-8') as csvfile:
+        for entry in csv.DictReader(csvfile):
+            index[(entry["Partei"], entry["Dateiname"])] = {name: int(entry[name]) for name in INDEX_HEADER[2:]}
+    return index
+
+def load_store_arrays(store_folder):
+    arrays = []
+    for name in ("keys.u32", "counts.u32"):
+        path = os.path.join(store_folder, name)
+        # Ein leerer Speicher lässt sich nicht mappen
+        arrays.append(np.memmap(path, dtype=np.uint32, mode='r') if os.path.getsize(path) else np.zeros(0, dtype=np.uint32))
+    return arrays
+
+def build_histogram_store(project_path, parties, store_folder):
+    """
+    Legt pro Bild das Farb-Histogramm in zwei fortlaufenden, speichergemappten uint32-Dateien ab (Schlüssel und
+    Pixelzahlen), index.csv verweist pro Bild auf seinen Abschnitt. Nur neue oder geänderte Bilder (Größe oder
+    Änderungszeit) werden dekodiert, die Histogramme der übrigen werden aus dem bisherigen Speicher übernommen.
+
+    """
+    if os.path.exists(os.path.join(project_path, "Database")):
+        database_folder = os.path.join(project_path, "Database")
+    else:
+        print(f"Es existiert keine Database in: {project_path}")
+        return
+
+    os.makedirs(store_folder, exist_ok=True)
+    tasks = csv_stage.collect_image_tasks(database_folder, parties, "none", 1)
+    previous = load_store_index(store_folder)
+
+    images = []
+    for party_folder, jpg_folder, _, filename, *_ in tasks:
+        image_path = os.path.join(jpg_folder, filename)
+        stat = os.stat(image_path)
+        images.append((party_folder, filename, image_path, stat.st_size, stat.st_mtime_ns))
+
+    unchanged = [(party_folder, filename) for party_folder, filename, _, size, mtime_ns in images
+                 if (party_folder, filename) in previous
+                 and previous[(party_folder, filename)]["Bytes"] == size
+                 and previous[(party_folder, filename)]["Mtime_ns"] == mtime_ns]
+    if len(unchanged) == len(images) == len(previous):
+        print(f"Histogramm-Speicher ist aktuell ({len(images)} Bilder): {store_folder}")
+        return
+
+    old_keys, old_counts = load_store_arrays(store_folder) if previous else (None, None)
+    unchanged = set(unchanged)
+    computed = 0
+
+    # In temporäre Dateien schreiben und erst am Ende austauschen, damit ein Abbruch den Speicher nicht beschädigt
+    paths = {name: os.path.join(store_folder, name) for name in ("keys.u32", "counts.u32", "index.csv")}
+    with open(paths["keys.u32"] + ".tmp", "wb") as keys_file, open(paths["counts.u32"] + ".tmp", "wb") as counts_file, \
+            open(paths["index.csv"] + ".tmp", mode='w', newline='', encoding='utf-8') as csvfile:
+        csv_writer = csv.writer(csvfile)
+        csv_writer.writerow(INDEX_HEADER)
+
+        position = 0
+        for party_folder, filename, image_path, size, mtime_ns in images:
+            if (party_folder, filename) in unchanged:
+                entry = previous[(party_folder, filename)]
+                # Kopien statt Ausschnitte, damit nach der Schleife kein Verweis auf die gemappten Dateien bleibt
+                keys = np.array(old_keys[entry["Start"]:entry["Ende"]])
+                counts = np.array(old_counts[entry["Start"]:entry["Ende"]])
+                pixel_count = entry["Pixel"]
+            else:
+                keys, counts, pixel_count = calculate_color_histogram(image_path)
+                computed += 1
+            keys_file.write(np.ascontiguousarray(keys).tobytes())
+            counts_file.write(np.ascontiguousarray(counts).tobytes())
+            csv_writer.writerow([party_folder, filename, position, position + len(keys), pixel_count, size, mtime_ns])
+            position += len(keys)
+
+    # Unter Windows lassen sich gemappte Dateien nicht ersetzen
+    del old_keys, old_counts
+    for path in paths.values():
+        os.replace(path + ".tmp", path)
+    with open(os.path.join(store_folder, "store.json"), "w", encoding="utf-8") as format_file:
+        json.dump(STORE_FORMAT, format_file)
+    # Dichte Matrix des alten Speicherformats
+    if os.path.exists(os.path.join(store_folder, "histograms.npy")):
+        os.remove(os.path.join(store_folder, "histograms.npy"))
+
+    print(f"Histogramm-Speicher mit {len(images)} Bildern wurde erstellt ({computed} neu berechnet, "
+          f"{len(images) - computed} übernommen, {8 * position / 1024 / max(1, len(images)):.1f} KB pro Bild): {store_folder}")
+
+def load_histogram_store(store_folder):
+    index = load_store_index(store_folder)
+    if not index:
+        raise FileNotFoundError(f"Kein Histogramm-Speicher im aktuellen Format in: {store_folder}")
+    keys, counts = load_store_arrays(store_folder)
+    return index, keys, counts
+
+def bin_match_weights(target_rgb_list, delta, bits=HISTOGRAM_BITS):
+    """
+    Berechnet pro Histogramm-Bin den Anteil seiner Farben, die innerhalb des Deltas zur Palette liegen.
+    Dafür wird die Lookup-Tabelle aus 02_csv.py auf die Bin-Auflösung herunteraggregiert.
+
+    """
+    levels = 1 << bits
+    step = 256 // levels
+
+    match = csv_stage.get_color_distance_lut(target_rgb_list).reshape(256, 256, 256) <= delta
+    match = match.reshape(levels, step, levels, step, levels, step)
+    return match.mean(axis=(1, 3, 5), dtype=np.float32).ravel()
+
+def color_shares_from_store(store_folder, target_rgb_dict, delta):
+    """
+    Berechnet die Farbanteile aller Bilder im Speicher für beliebige Paletten und Deltas,
+    ohne ein einziges JPEG erneut zu dekodieren. Exakt gespeicherte Farben werden direkt in der Lookup-Tabelle
+    nachgeschlagen, für die Bins des Rest-Histogramms gilt der Anteil passender Farben im Bin.
+    Ergebnis: Zeilen [Partei, Dateiname, Farbanteil].
+
+    """
+    index, keys, counts = load_histogram_store(store_folder)
+
+    entries_by_party = {}
+    for (party, filename), entry in index.items():
+        entries_by_party.setdefault(party, []).append((filename, entry))
+
+    results = []
+    for party, entries in entries_by_party.items():
+        if party not in target_rgb_dict:
+            continue
+        exact_match = csv_stage.get_color_distance_lut(target_rgb_dict[party]) <= delta
+        bin_weights = bin_match_weights(target_rgb_dict[party], delta)
+
+        starts = np.array([entry["Start"] for _, entry in entries])
+        ends = np.array([entry["Ende"] for _, entry in entries])
+        pixels = np.array([entry["Pixel"] for _, entry in entries])
+
+        # Die Abschnitte einer Partei liegen zusammen, daher genügt eine kumulierte Summe über ihren Bereich
+        first, last = starts.min(), ends.max()
+        party_keys = np.asarray(keys[first:last], dtype=np.int64)
+        exact = party_keys < EXACT_KEYS
+        weights = np.empty(len(party_keys), dtype=np.float64)
+        weights[exact] = exact_match[party_keys[exact]]
+        weights[~exact] = bin_weights[party_keys[~exact] - EXACT_KEYS]
+
+        cumulative = np.concatenate([[0.0], np.cumsum(weights * counts[first:last])])
+        shares = (cumulative[ends - first] - cumulative[starts - first]) / pixels
+        for (filename, _), share in zip(entries, shares):
+            results.append([party, filename, round(float(share), 4)])
+    return results
+
+def report_store_error(project_path, parties, store_folder, target_rgb_dict, delta=40):
+    """
+    Vergleicht die Farbanteile aus dem Histogramm-Speicher mit dem exakten Farbanteil aus 02_csv.py
+    und schreibt den Fehler pro Bild in eine CSV. Pro Partei werden mittlerer und maximaler Fehler ausgegeben.
+
+    """
+    if os.path.exists(os.path.join(project_path, "Database")):
+        database_folder = os.path.join(project_path, "Database")
+    else:
+        print(f"Es existiert keine Database in: {project_path}")
+        return
+
+    report_file = os.path.join(project_path, "histogram_store_report.csv")
+    jpg_folders = {party_folder: jpg_folder for party_folder, jpg_folder, *_ in
+                   csv_stage.collect_image_tasks(database_folder, parties, "none", 1)}
+
+    errors = {}
+    with open(report_file, mode='w', newline='', encoding='utf-8') as csvfile:
+        csv_writer = csv.writer(csvfile)
+        csv_writer.writerow(["Partei", "Dateiname", "Farbanteil", "Farbanteil Speicher", "Fehler"])
+
+        for party_folder, filename, share in color_shares_from_store(store_folder, target_rgb_dict, delta):
+            if party_folder not in jpg_folders:
+                continue
+            jpg_file_path = os.path.join(jpg_folders[party_folder], filename)
+            reference = csv_stage.calculate_color_percentage(jpg_file_path, target_rgb_dict[party_folder], None, delta, False)
+            error = round(share - reference, 4)
+            errors.setdefault(party_folder, []).append(abs(error))
+            csv_writer.writerow([party_folder, filename, reference, share, error])
+
+    for party_folder, party_errors in errors.items():
+        print(f"{party_folder}: mittlerer Fehler {np.mean(party_errors):.4f}, maximaler Fehler {np.max(party_errors):.4f}")
+    print(f"Fehlerbericht wurde erstellt: {report_file}")
+
+if __name__ == "__main__":
+    project_path = r"C:\Users\pasol\Pictures\Database_CulturalAnalytics"
+    store_folder = os.path.join(project_path, "Histogram_Store")
+
+    target_rgb_dict = {
+        "afd.bund" : [(19,155,217),(254,0,0),(226,1,1),(3,70,122),(90,204,255)],
+        "cdu" : [(82,183,193),(63,137,198),(249,180,0),(225,0,24)],
+        "csu" : [(154,201,21),(33,131,206),(19,230,249),(0,125,184),(16,228,249),(72,199,240),(117,184,255),(36,180,145),(214,249,23)],
+        "die_gruenen" : [(255,239,38),(74,150,41),(230,0,126),(158,200,102),(18,96,50),(255,241,122),(139,188,37),(0,137,57)],
+        "dielinke" : [(226,6,18),(79,187,199),(112,0,59),(232,78,68)],
+        "fdp" : [(254,237,1),(0,159,227),(227,1,126),(166,2,125),(254,138,173)],
+        "spdde" : [(224,0,26),(255,89,49),(166,26,1)]
+    }
+
+    # Nur neue oder geänderte Bilder dekodieren und ihre Histogramme speichern
+    build_histogram_store(project_path, list(target_rgb_dict), store_folder)
+
+    # Fehler des Speichers gegenüber dem exakten Farbanteil vorab prüfen (dekodiert jedes Bild erneut)
+    report_error = False
+
+    if report_error:
+        report_store_error(project_path, list(target_rgb_dict), store_folder, target_rgb_dict, 40)
+    else:
+        # Palettenexperimente direkt auf dem Speicher
+        for party, filename, share in color_shares_from_store(store_folder, target_rgb_dict, 40)[:10]:
+            print(party, filename, share)
@@ -0,0 +1,83 @@
+import os
+import json
+import pandas as pd
+
+# Feather (Arrow) erlaubt memory-mapped Laden; ohne pyarrow wird ein Pickle-Cache verwendet
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+# Kompakte Datentypen für die Spalten von result.csv
+COLUMN_DTYPES = {
+    "Partei": "category",
+    "Slideshow": "int8",
+    "Slide": "int16",
+    "Likes": "int32",
+    "Kommentare": "int32",
+    # Farbanteil bleibt float64: mit float32 verschieben sich gerundete Monatsmittel in der vierten Nachkommastelle
+    "Farbanteil": "float64",
+}
+
+def cache_paths(input_csv_path):
+    suffix = ".feather" if feather is not None else ".pkl"
+    return input_csv_path + suffix, input_csv_path + ".cache.json"
+
+def csv_identity(input_csv_path):
+    stat = os.stat(input_csv_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def read_typed_csv(input_csv_path):
+    return apply_column_dtypes(pd.read_csv(input_csv_path))
+
+def apply_column_dtypes(df):
+    # Auch für Teilstücke der CSV verwendet (inkrementelles Nachladen, Chunks)
+    df['Datum'] = pd.to_datetime(df['Datum'])
+
+    for column, dtype in COLUMN_DTYPES.items():
+        if column not in df.columns:
+            continue
+        # Fehlende Werte (z. B. Likes ohne Metadaten) brauchen den nullable Integer-Typ
+        if dtype.startswith("int") and df[column].isna().any():
+            dtype = dtype.capitalize()
+        df[column] = df[column].astype(dtype)
+    return df
+
+def iter_dataset_chunks(input_csv_path, chunksize):
+    # result.csv stückweise mit denselben Datentypen lesen, der Speicherbedarf hängt nur von chunksize ab
+    for chunk in pd.read_csv(input_csv_path, chunksize=chunksize):
+        yield apply_column_dtypes(chunk)
+
+def load_dataset(input_csv_path, use_cache=True):
+    """
+    Lädt result.csv mit festen Datentypen (Partei kategorial, Datum als datetime, kompakte Ganzzahlen). Beim ersten Laden wird daneben ein spaltenorientierter Cache geschrieben,
+    der bei jeder Änderung der CSV (Größe oder Änderungszeit) neu erzeugt wird.
+
+    """
+    if not use_cache:
+        return read_typed_csv(input_csv_path)
+
+    cache_path, identity_path = cache_paths(input_csv_path)
+    identity = csv_identity(input_csv_path)
+
+    if os.path.exists(cache_path) and os.path.exists(identity_path):
+        with open(identity_path, "r", encoding="utf-8") as identity_file:
+            if json.load(identity_file) == identity:
+                if feather is not None:
+                    return feather.read_table(cache_path, memory_map=True).to_pandas()
+                return pd.read_pickle(cache_path)
+
+    df = read_typed_csv(input_csv_path)
+
+    try:
+        if feather is not None:
+            feather.write_feather(df, cache_path)
+        else:
+            df.to_pickle(cache_path)
+        with open(identity_path, "w", encoding="utf-8") as identity_file:
+            json.dump(identity, identity_file)
+    except OSError as e:
+        # Ohne Schreibrechte neben der CSV einfach ohne Cache weiterarbeiten
+        print(f"Cache konnte nicht geschrieben werden: {e}")
+
+    return df
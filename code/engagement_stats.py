@@ -0,0 +1,226 @@
+import os
+import zlib
+import numpy as np
+import pandas as pd
+from scipy import stats
+from dataset import load_dataset
+
+# Engagement-Kennzahlen aus result.csv, die gegen den Farbanteil ausgewertet werden
+METRICS = ("Likes", "Kommentare")
+
+MIN_COLOR_SHARE = 0.1
+LOWER_QUANTILE = 0.05
+UPPER_QUANTILE = 0.95
+
+# Voreinstellungen für Permutationstests und Bootstrap-Intervalle
+RESAMPLES = 2000
+CONFIDENCE = 0.95
+# Einträge pro Blockmatrix (Stichproben x n); die Stichproben pro Block ergeben sich aus der Gruppengröße,
+# so bleibt der Speicherbedarf unabhängig von n (1 Mio. float64 = 8 MB pro Matrix)
+BATCH_ELEMENTS = 1_000_000
+
+def trim_engagement(df, metrics=METRICS, period=None, min_color_share=MIN_COLOR_SHARE,
+                    lower=LOWER_QUANTILE, upper=UPPER_QUANTILE):
+    """
+    Bringt die Kennzahlen in ein langes Format (Partei, [Zeitraum,] Metrik, Farbanteil, Wert), entfernt Bilder mit
+    Farbanteil <= min_color_share und schneidet pro Gruppe alles außerhalb der Quantile lower/upper ab.
+    Mit period (z. B. "Y" oder "Q") wird zusätzlich pro Zeitraum gruppiert.
+
+    """
+    df = df[df['Farbanteil'] > min_color_share]
+    id_columns = ['Partei', 'Farbanteil']
+    if period is not None:
+        df = df.assign(Zeitraum=df['Datum'].dt.to_period(period).astype(str))
+        id_columns.insert(1, 'Zeitraum')
+
+    long_df = df.melt(id_vars=id_columns, value_vars=list(metrics), var_name='Metrik', value_name='Wert')
+    long_df = long_df.dropna(subset=['Wert'])
+    long_df['Wert'] = long_df['Wert'].astype(float)
+
+    keys = group_keys(long_df)
+    # Quantile aller Gruppen in einem Durchgang, danach per Transform zurück auf die Zeilen
+    grouped = long_df.groupby(keys, observed=True, sort=False)['Wert']
+    lower_bound = grouped.transform('quantile', lower)
+    upper_bound = grouped.transform('quantile', upper)
+    return long_df[(long_df['Wert'] > lower_bound) & (long_df['Wert'] < upper_bound)].reset_index(drop=True)
+
+def group_keys(long_df):
+    return [key for key in ('Partei', 'Zeitraum', 'Metrik') if key in long_df.columns]
+
+def engagement_statistics(trimmed):
+    """
+    Berechnet für alle Gruppen aus trim_engagement gleichzeitig Anzahl, OLS-Steigung und -Achsenabschnitt
+    (Wert = Steigung * Farbanteil + Achsenabschnitt) sowie Pearson- und Spearman-Korrelation.
+    Spearman ist die Pearson-Korrelation der Ränge (Mittelränge bei Gleichständen wie in scipy.stats.spearmanr).
+
+    """
+    keys = group_keys(trimmed)
+    by_group = [trimmed[key] for key in keys]
+    grouped = trimmed.groupby(keys, observed=True, sort=False)
+
+    data = pd.DataFrame({
+        'x': trimmed['Farbanteil'].astype(float),
+        'y': trimmed['Wert'],
+        'rx': grouped['Farbanteil'].rank(method='average'),
+        'ry': grouped['Wert'].rank(method='average'),
+    })
+    means = data.groupby(by_group, observed=True, sort=False).mean()
+
+    # Zentrierte Summen statt roher Potenzsummen, damit große Like-Zahlen nicht an Genauigkeit verlieren
+    centered = data - data.groupby(by_group, observed=True, sort=False).transform('mean')
+    products = pd.DataFrame({
+        'sxx': centered['x'] ** 2,
+        'syy': centered['y'] ** 2,
+        'sxy': centered['x'] * centered['y'],
+        'srxx': centered['rx'] ** 2,
+        'sryy': centered['ry'] ** 2,
+        'srxy': centered['rx'] * centered['ry'],
+    })
+    sums = products.groupby(by_group, observed=True, sort=False).sum()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = sums['sxy'] / sums['sxx']
+        result = pd.DataFrame({
+            'Anzahl': grouped.size(),
+            'Steigung': slope,
+            'Achsenabschnitt': means['y'] - slope * means['x'],
+            'Pearson': sums['sxy'] / np.sqrt(sums['sxx'] * sums['syy']),
+            'Spearman': sums['srxy'] / np.sqrt(sums['srxx'] * sums['sryy']),
+        })
+    return result.reset_index().sort_values(keys, kind='stable').reset_index(drop=True)
+
+def group_rng(seed, group):
+    # Eigener Zufallsstrom pro Gruppe, damit das Ergebnis einer Partei nicht von der Auswahl der übrigen abhängt
+    label = "|".join(str(value) for value in group)
+    return np.random.default_rng([seed, zlib.crc32(label.encode("utf-8"))])
+
+def standardize(values):
+    # Zeilenweise z-Werte (Populations-Standardabweichung), damit r = Mittelwert von zx * zy
+    centered = values - values.mean(axis=-1, keepdims=True)
+    return centered / np.sqrt((centered ** 2).mean(axis=-1, keepdims=True))
+
+def batch_rows(columns, batch_elements=BATCH_ELEMENTS):
+    # Stichproben pro Block, so dass eine (Stichproben x columns)-Matrix höchstens batch_elements Einträge hat
+    return max(1, batch_elements // max(1, columns))
+
+def permutation_p_values(x, y, rng, resamples=RESAMPLES, batch_elements=BATCH_ELEMENTS):
+    """
+    Zweiseitige Permutations-p-Werte für Pearson und Spearman. Die Permutationen werden blockweise als Indexmatrix
+    erzeugt und jede Korrelation eines Blocks als ein Matrix-Vektor-Produkt berechnet.
+    Für die OLS-Steigung gilt derselbe p-Wert wie für Pearson, da sie bei festen x und y proportional zu r ist.
+
+    """
+    n = len(x)
+    zx, zy = standardize(x), standardize(y)
+    rank_x, rank_y = standardize(stats.rankdata(x)), standardize(stats.rankdata(y))
+    observed_pearson = abs(zx @ zy / n)
+    observed_spearman = abs(rank_x @ rank_y / n)
+
+    pearson_hits = spearman_hits = 0
+    batch_size = batch_rows(n, batch_elements)
+    for start in range(0, resamples, batch_size):
+        size = min(batch_size, resamples - start)
+        permutations = rng.permuted(np.tile(np.arange(n), (size, 1)), axis=1)
+        # Kleine Toleranz, damit numerisch gleiche Korrelationen als "mindestens so extrem" zählen
+        pearson_hits += np.count_nonzero(np.abs(zy[permutations] @ zx / n) >= observed_pearson - 1e-12)
+        spearman_hits += np.count_nonzero(np.abs(rank_y[permutations] @ rank_x / n) >= observed_spearman - 1e-12)
+
+    return (pearson_hits + 1) / (resamples + 1), (spearman_hits + 1) / (resamples + 1)
+
+def resample_ranks(codes, levels, indices):
+    """
+    Mittelränge innerhalb jeder Bootstrap-Stichprobe ohne erneutes Sortieren: codes ist der dichte Rang
+    (0 .. levels-1) jedes Originalwerts, gezählt wird, wie oft jeder Wert pro Stichprobe gezogen wurde.
+
+    """
+    sampled = codes[indices]
+    offsets = levels * np.arange(len(indices))[:, None]
+    counts = np.bincount((sampled + offsets).ravel(), minlength=len(indices) * levels).reshape(len(indices), levels)
+    average_ranks = np.cumsum(counts, axis=1) - counts + (counts + 1) / 2
+    return np.take_along_axis(average_ranks, sampled, axis=1)
+
+def bootstrap_intervals(x, y, rng, resamples=RESAMPLES, confidence=CONFIDENCE, batch_elements=BATCH_ELEMENTS):
+    """
+    Perzentil-Bootstrap-Intervalle für Steigung, Pearson und Spearman. Jeder Block von Stichproben wird als
+    (Stichproben x n)-Matrix gezogen und zeilenweise ausgewertet.
+
+    """
+    n = len(x)
+    x_levels, x_codes = np.unique(x, return_inverse=True)
+    y_levels, y_codes = np.unique(y, return_inverse=True)
+    slopes, pearsons, spearmans = [], [], []
+    # Auch die Zählmatrix in resample_ranks (Stichproben x Anzahl Werte) hat höchstens n Spalten
+    batch_size = batch_rows(n, batch_elements)
+    for start in range(0, resamples, batch_size):
+        size = min(batch_size, resamples - start)
+        indices = rng.integers(0, n, (size, n))
+        x_sample, y_sample = x[indices], y[indices]
+
+        x_centered = x_sample - x_sample.mean(axis=1, keepdims=True)
+        y_centered = y_sample - y_sample.mean(axis=1, keepdims=True)
+        sxy = (x_centered * y_centered).sum(axis=1)
+        sxx = (x_centered ** 2).sum(axis=1)
+        syy = (y_centered ** 2).sum(axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slopes.append(sxy / sxx)
+            pearsons.append(sxy / np.sqrt(sxx * syy))
+            spearmans.append((standardize(resample_ranks(x_codes, len(x_levels), indices)) *
+                              standardize(resample_ranks(y_codes, len(y_levels), indices))).mean(axis=1))
+
+    alpha = (1 - confidence) / 2
+    bounds = {}
+    for name, values in (('Steigung', slopes), ('Pearson', pearsons), ('Spearman', spearmans)):
+        lower, upper = np.nanquantile(np.concatenate(values), [alpha, 1 - alpha])
+        bounds[f'{name}_KI_unten'] = lower
+        bounds[f'{name}_KI_oben'] = upper
+    return bounds
+
+def correlation_inference(trimmed, resamples=RESAMPLES, confidence=CONFIDENCE, seed=0, batch_elements=BATCH_ELEMENTS):
+    """
+    Ergänzt engagement_statistics um Permutations-p-Werte und Bootstrap-Konfidenzintervalle pro Gruppe.
+    Mit gleichem seed sind die Ergebnisse reproduzierbar.
+
+    """
+    keys = group_keys(trimmed)
+    result = engagement_statistics(trimmed).set_index(keys)
+
+    rows = {}
+    for group, group_df in trimmed.groupby(keys, observed=True, sort=False):
+        x = group_df['Farbanteil'].to_numpy(dtype=float)
+        y = group_df['Wert'].to_numpy(dtype=float)
+        row = {}
+        if len(x) >= 3:
+            rng = group_rng(seed, group)
+            pearson_p, spearman_p = permutation_p_values(x, y, rng, resamples, batch_elements)
+            row = {'Pearson_p': pearson_p, 'Spearman_p': spearman_p, 'Steigung_p': pearson_p}
+            row.update(bootstrap_intervals(x, y, rng, resamples, confidence, batch_elements))
+        rows[group] = row
+
+    inference = pd.DataFrame.from_dict(rows, orient='index')
+    inference.index.names = keys
+    return result.join(inference).reset_index()
+
+def engagement_statistics_report(input_csv_path, output_path, df=None, render_pool=None, metrics=METRICS, period=None,
+                                 inference=False, resamples=RESAMPLES, seed=0):
+    # Tabelle aller Parteien und Kennzahlen als CSV; render_pool wird nur für die einheitliche Runner-Signatur angenommen
+    try:
+        df = load_dataset(input_csv_path) if df is None else df
+
+        trimmed = trim_engagement(df, metrics, period)
+        if inference:
+            result = correlation_inference(trimmed, resamples=resamples, seed=seed)
+        else:
+            result = engagement_statistics(trimmed)
+
+        output_path_csv = os.path.join(output_path, "CSV.csv")
+        result.to_csv(output_path_csv, index=False)
+        print(f"Die Statistik-Tabelle wurde erfolgreich erstellt: {output_path_csv}")
+
+    except Exception as e:
+        print(f"Ein Fehler ist aufgetreten: {e}")
+
+if __name__ == "__main__":
+    input_csv_path = r"C:\\Users\\pasol\\Pictures\\Database_CulturalAnalytics\\02_Processed\\result.csv"
+    output_path = r"C:\\Users\\pasol\\Pictures\\Database_CulturalAnalytics\\03_Analytics\\09_EngagementStatistics"
+    engagement_statistics_report(input_csv_path, output_path)
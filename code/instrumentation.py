@@ -0,0 +1,193 @@
+import os
+import csv
+import json
+import time
+import threading
+import contextlib
+import functools
+import cProfile
+import pstats
+
+# pyinstrument ist ein Sampling-Profiler; ohne ihn wird auf den deterministischen cProfile zurückgegriffen
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:
+    SamplingProfiler = None
+
+class Metrics:
+    """
+    Sammelt Laufzeiten (Anzahl und Sekunden pro Name), Zähler (z. B. gelesene Bytes, Cache-Treffer) und Einzelwerte
+    einer Pipeline-Stufe. Worker-Prozesse geben ihre Werte als snapshot zurück, der Hauptprozess führt sie mit merge zusammen.
+
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.timings = {}
+        self.counters = {}
+        self.values = {}
+        self.started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def add_time(self, name, seconds, count=1):
+        with self.lock:
+            timing = self.timings.setdefault(name, [0, 0.0])
+            timing[0] += count
+            timing[1] += seconds
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value):
+        with self.lock:
+            self.values[name] = value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "timings": {name: list(timing) for name, timing in self.timings.items()},
+                "counters": dict(self.counters),
+            }
+
+    def merge(self, snapshot):
+        for name, (count, seconds) in snapshot["timings"].items():
+            self.add_time(name, seconds, count)
+        for name, value in snapshot["counters"].items():
+            self.count(name, value)
+
+    def summary(self):
+        with self.lock:
+            return {
+                "laufzeit_s": round(time.perf_counter() - self.started, 3),
+                "zeiten": {
+                    name: {"anzahl": count, "sekunden": round(seconds, 4),
+                           "ms_pro_aufruf": round(1000 * seconds / count, 3) if count else None}
+                    for name, (count, seconds) in self.timings.items()
+                },
+                "zaehler": dict(self.counters),
+                "werte": dict(self.values),
+            }
+
+    def write_summary(self, output_folder, name="metrics"):
+        """
+        Schreibt die Zusammenfassung als <name>.json und in flacher Form als <name>.csv (Art, Name, Anzahl, Wert).
+
+        """
+        summary = self.summary()
+        os.makedirs(output_folder, exist_ok=True)
+
+        json_path = os.path.join(output_folder, name + ".json")
+        with open(json_path, "w", encoding="utf-8") as json_file:
+            json.dump(summary, json_file, indent=2, ensure_ascii=False)
+
+        csv_path = os.path.join(output_folder, name + ".csv")
+        with open(csv_path, "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["Art", "Name", "Anzahl", "Wert"])
+            writer.writerow(["laufzeit", "gesamt", 1, summary["laufzeit_s"]])
+            for timer_name, timing in summary["zeiten"].items():
+                writer.writerow(["zeit", timer_name, timing["anzahl"], timing["sekunden"]])
+            for counter_name, value in summary["zaehler"].items():
+                writer.writerow(["zaehler", counter_name, "", value])
+            for value_name, value in summary["werte"].items():
+                writer.writerow(["wert", value_name, "", value])
+
+        print(f"Laufzeit-Metriken gespeichert unter: {json_path}")
+        return summary
+
+# Eine Instanz pro Prozess, in die alle Stufen berichten
+metrics = Metrics()
+
+_settings = {"quiet": False, "profiler": None, "profiling": False}
+
+def configure(quiet=None, profile=None):
+    """
+    quiet=True ersetzt die Ausgaben pro Datei durch die Metrik-Zusammenfassung am Ende.
+    profile=True startet einen Profiler, der nur während der mit @profiled markierten Funktionen läuft.
+    Der Profiler zeichnet nur den eigenen Prozess auf; Stufen mit Worker-Prozessen laufen beim Profilieren seriell.
+
+    """
+    if quiet is not None:
+        _settings["quiet"] = quiet
+    if profile is not None:
+        if profile and _settings["profiler"] is None:
+            _settings["profiler"] = SamplingProfiler() if SamplingProfiler is not None else cProfile.Profile()
+        elif not profile:
+            _settings["profiler"] = None
+
+def profiling_enabled():
+    return _settings["profiler"] is not None
+
+def progress(message):
+    # Fortschrittsmeldung pro Datei, im quiet-Modus unterdrückt
+    if not _settings["quiet"]:
+        print(message)
+
+def profiled(function):
+    # Markiert eine heiße Funktion: bei aktivem Profiler wird nur ihre Ausführung aufgezeichnet
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        profiler = _settings["profiler"]
+        # Verschachtelte markierte Aufrufe laufen im bereits aktiven Profiler mit
+        if profiler is None or _settings["profiling"]:
+            return function(*args, **kwargs)
+        _settings["profiling"] = True
+        start_profiler(profiler)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stop_profiler(profiler)
+            _settings["profiling"] = False
+    return wrapper
+
+def start_profiler(profiler):
+    if isinstance(profiler, cProfile.Profile):
+        profiler.enable()
+    else:
+        profiler.start()
+
+def stop_profiler(profiler):
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+    else:
+        profiler.stop()
+
+def write_profile(output_folder, name="profile"):
+    # Profil der @profiled-Funktionen speichern: HTML bei pyinstrument, sonst Textauszug und .prof für snakeviz & Co.
+    profiler = _settings["profiler"]
+    if profiler is None:
+        return None
+    os.makedirs(output_folder, exist_ok=True)
+
+    # Ohne einen Aufruf einer @profiled-Funktion in diesem Prozess gibt es nichts zu speichern
+    if isinstance(profiler, cProfile.Profile):
+        profiler.create_stats()
+        empty = not profiler.stats
+    else:
+        empty = profiler.last_session is None
+    if empty:
+        print("Profil ist leer, es wurde keine @profiled-Funktion in diesem Prozess ausgeführt")
+        return None
+
+    if isinstance(profiler, cProfile.Profile):
+        profile_path = os.path.join(output_folder, name + ".prof")
+        profiler.dump_stats(profile_path)
+        with open(os.path.join(output_folder, name + ".txt"), "w", encoding="utf-8") as text_file:
+            pstats.Stats(profile_path, stream=text_file).sort_stats("cumulative").print_stats(40)
+    else:
+        profile_path = os.path.join(output_folder, name + ".html")
+        with open(profile_path, "w", encoding="utf-8") as html_file:
+            html_file.write(profiler.output_html())
+
+    print(f"Profil gespeichert unter: {profile_path}")
+    return profile_path
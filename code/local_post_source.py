@@ -0,0 +1,91 @@
+import os
+import lzma
+import json
+import time
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from PIL import Image
+import numpy as np
+
+class LocalPost:
+    """
+    Lokaler Ersatz für instaloader.Post mit den Feldern, die der Download verwendet.
+
+    """
+    def __init__(self, date_utc, is_video=False, likes=0, comments=0, slides=1):
+        self.date_utc = date_utc
+        self.is_video = is_video
+        self.likes = likes
+        self.comments = comments
+        self.slides = slides
+        # Über Läufe hinweg stabil, damit fehlgeschlagene Posts per Shortcode erneut geladen werden können
+        self.shortcode = format(int(date_utc.replace(tzinfo=timezone.utc).timestamp()), "x")
+
+    def filename(self):
+        return self.date_utc.strftime("%Y-%m-%d_%H-%M-%S_UTC")
+
+class LocalPostSource:
+    """
+    Offline-Quelle für Posts im Stil von Instaloader: liefert den Feed vom neuesten zum ältesten Post
+    und schreibt beim "Download" Bilddateien und .json.xz Metadaten in den Zielordner.
+    Mit latency und failure_rate lassen sich Netzwerkwartezeit und Verbindungsfehler nachstellen.
+
+    """
+    def __init__(self, posts, target_folder, latency=0.0, failure_rate=0.0, image_size=(64, 64), seed=0):
+        self.posts = sorted(posts, key=lambda post: post.date_utc, reverse=True)
+        self.target_folder = target_folder
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.image_size = image_size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def get_posts(self):
+        yield from self.posts
+
+    def get_post(self, shortcode):
+        for post in self.posts:
+            if post.shortcode == shortcode:
+                return post
+        raise KeyError(f"Unbekannter Shortcode: {shortcode}")
+
+    def _request(self):
+        with self.lock:
+            self.requests += 1
+            failed = self.random.random() < self.failure_rate
+        time.sleep(self.latency)
+        if failed:
+            raise ConnectionError("Simulierter Verbindungsfehler")
+
+    def download_metadata(self, post):
+        self._request()
+        os.makedirs(self.target_folder, exist_ok=True)
+        data = {"node": {"edge_media_preview_like": {"count": post.likes}, "comments": post.comments}}
+        metadata_path = os.path.join(self.target_folder, post.filename() + ".json.xz")
+        with lzma.open(metadata_path, "wt", encoding="utf-8") as compressed_file:
+            json.dump(data, compressed_file)
+
+    def download_post(self, post):
+        self.download_metadata(post)
+        rng = np.random.default_rng(int(post.date_utc.timestamp()))
+        width, height = self.image_size
+        for slide in range(1, post.slides + 1):
+            suffix = f"_{slide}" if post.slides > 1 else ""
+            pixels = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(os.path.join(self.target_folder, post.filename() + suffix + ".jpg"))
+
+def generate_local_posts(count, end_date=datetime(2024, 12, 18), spacing=timedelta(hours=20), seed=0):
+    # Gleichmäßig verteilte Posts mit zufälligen Likes, Kommentaren, Videos und Karussells
+    rng = random.Random(seed)
+    posts = []
+    for index in range(count):
+        posts.append(LocalPost(
+            end_date - index * spacing,
+            is_video=rng.random() < 0.1,
+            likes=rng.randint(0, 20000),
+            comments=rng.randint(0, 2000),
+            slides=rng.choice([1, 1, 1, 2, 3, 5]),
+        ))
+    return posts
@@ -0,0 +1,84 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+
+# dHash mit 8 x 8 = 64 Bit
+HASH_SIZE = 8
+# Bis zu diesem Hamming-Abstand gelten zwei Bilder als nahezu identisch (z. B. erneut komprimierte Reposts)
+MAX_HASH_DISTANCE = 4
+# Farbvorschau mit 8 x 8 RGB-Pixeln; der dHash sieht nur Helligkeitsverläufe, flächige Grafiken
+# unterschiedlicher Farbe hätten sonst oft denselben Hash
+THUMBNAIL_SIZE = 8
+# Größte erlaubte Abweichung eines Kanals der Farbvorschau (0-255)
+MAX_COLOR_DIFFERENCE = 12
+
+def image_signature(image_path, hash_size=HASH_SIZE, thumbnail_size=THUMBNAIL_SIZE):
+    """
+    Perzeptueller Hash (dHash) und Farbvorschau aus einer einzigen stark verkleinerten Dekodierung.
+    Für den dHash wird das Graustufenbild auf (hash_size + 1) x hash_size Pixel verkleinert, jedes Bit gibt an,
+    ob ein Pixel heller ist als sein linker Nachbar. Beides wird als Hex-String zurückgegeben.
+
+    """
+    with Image.open(image_path) as image:
+        # JPEGs direkt in reduzierter Auflösung dekodieren, für Hash und Vorschau genügen wenige Pixel
+        image.draft('RGB', (hash_size * 8, hash_size * 8))
+        image = image.convert('RGB')
+        gray = image.convert('L').resize((hash_size + 1, hash_size), Image.BOX)
+        thumbnail = image.resize((thumbnail_size, thumbnail_size), Image.BOX)
+
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return np.packbits(bits).tobytes().hex(), thumbnail.tobytes().hex()
+
+def image_signatures(image_paths, workers=1):
+    # Signaturen in Eingabereihenfolge, bei workers > 1 über einen Prozess-Pool
+    if workers > 1 and len(image_paths) > 1:
+        chunksize = max(1, len(image_paths) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(image_signature, image_paths, chunksize=chunksize))
+    return [image_signature(image_path) for image_path in image_paths]
+
+def hamming_distance(hash_a, hash_b):
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+def color_difference(thumbnail_a, thumbnail_b):
+    a = np.frombuffer(bytes.fromhex(thumbnail_a), dtype=np.uint8).astype(np.int16)
+    b = np.frombuffer(bytes.fromhex(thumbnail_b), dtype=np.uint8).astype(np.int16)
+    return int(np.abs(a - b).max())
+
+def group_near_duplicates(signatures, max_distance=MAX_HASH_DISTANCE, max_color_difference=MAX_COLOR_DIFFERENCE):
+    """
+    Ordnet jedes Bild dem ersten vorherigen Bild zu, dessen Hash sich in höchstens max_distance Bits unterscheidet
+    und dessen Farbvorschau um höchstens max_color_difference abweicht; sonst beginnt es eine eigene Gruppe.
+    Gibt pro Bild die Gruppe als Index ihres ersten Bilds zurück. Verglichen wird nur mit diesen ersten Bildern,
+    so dass sich keine Ketten ähnlicher Bilder zu einer großen Gruppe verbinden.
+    Nach dem Schubfachprinzip stimmen zwei passende Hashes in mindestens einem von max_distance + 1 Abschnitten
+    exakt überein, Kandidaten sind daher nur Gruppen mit einem gemeinsamen Abschnitt.
+
+    """
+    if not signatures:
+        return []
+    bit_count = 4 * len(signatures[0][0])
+    bands = min(max_distance + 1, bit_count)
+    bounds = [bit_count * band // bands for band in range(bands + 1)]
+    buckets = [{} for _ in range(bands)]
+
+    groups = []
+    representatives = {}
+    for index, (image_hash, thumbnail) in enumerate(signatures):
+        value = int(image_hash, 16)
+        band_values = [(value >> start) & ((1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+
+        candidates = sorted({candidate for bucket, band_value in zip(buckets, band_values)
+                             for candidate in bucket.get(band_value, ())})
+        group = next((candidate for candidate in candidates
+                      if bin(value ^ representatives[candidate][0]).count("1") <= max_distance
+                      and color_difference(thumbnail, representatives[candidate][1]) <= max_color_difference), None)
+
+        if group is None:
+            group = index
+            representatives[index] = (value, thumbnail)
+            for bucket, band_value in zip(buckets, band_values):
+                bucket.setdefault(band_value, []).append(index)
+        groups.append(group)
+    return groups
@@ -0,0 +1,194 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.colors import LinearSegmentedColormap, LogNorm
+from matplotlib.patches import Patch
+from matplotlib import patheffects
+
+# Darstellung der Streudiagramme: einzelne Punkte, Dichteraster oder je nach Punktzahl automatisch
+PLOT_MODES = ("auto", "scatter", "density")
+# Ab dieser Punktzahl pro Diagramm zeichnet "auto" ein Dichteraster
+DENSITY_THRESHOLD = 20000
+DENSITY_BINS = 100
+
+class RenderPool:
+    """
+    Rendert unabhängige Abbildungen parallel in Worker-Prozessen, während der aufrufende Prozess
+    weiterrechnet. Mit workers <= 1 wird direkt im aufrufenden Prozess gerendert.
+
+    """
+    def __init__(self, workers=None):
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        self.futures = []
+
+    def submit(self, render_function, *args, **kwargs):
+        if self.executor is None:
+            render_function(*args, **kwargs)
+        else:
+            self.futures.append(self.executor.submit(render_function, *args, **kwargs))
+
+    def wait(self):
+        # Auf alle eingereichten Abbildungen warten; Fehler einzelner Abbildungen brechen den Lauf nicht ab
+        for future in self.futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Fehler beim Rendern einer Abbildung: {e}")
+        self.futures = []
+
+    def close(self):
+        self.wait()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def render(render_pool, render_function, *args, **kwargs):
+    # Ohne Pool (z. B. beim direkten Aufruf eines Skripts) wird sofort gerendert
+    if render_pool is None:
+        render_function(*args, **kwargs)
+    else:
+        render_pool.submit(render_function, *args, **kwargs)
+
+def render_party_lines(output_path, series, xlabel, ylabel, title, ticks=None, grid=None, figsize=(10, 6),
+                       marker=None, legend_title=None, tight_layout=True, savefig_kwargs=None, message=None):
+    """
+    Zeichnet eine Linie pro Partei. series ist eine Liste von (Partei, x, y, Farbe),
+    ticks optional (Positionen, Beschriftungen, Rotation), grid optional die Argumente für Axes.grid.
+
+    """
+    figure = Figure(figsize=figsize)
+    axes = figure.subplots()
+
+    for label, x, y, color in series:
+        axes.plot(x, y, marker=marker, label=label, color=color)
+
+    axes.set_xlabel(xlabel)
+    axes.set_ylabel(ylabel)
+    axes.set_title(title)
+    axes.legend(title=legend_title)
+
+    if grid is not None:
+        axes.grid(**grid)
+    if ticks is not None:
+        positions, labels, rotation = ticks
+        if labels is None:
+            axes.set_xticks(positions)
+        else:
+            axes.set_xticks(positions, labels=labels, rotation=rotation)
+    if tight_layout:
+        figure.tight_layout()
+
+    figure.savefig(output_path, **(savefig_kwargs or {}))
+    if message:
+        print(message)
+
+def render_scatter_regression(output_path, x, y, label, color, slope, intercept, annotation, xlabel, ylabel, title, message=None):
+    """
+    Streudiagramm einer Partei mit Regressionslinie und Textfeld für die Korrelationskoeffizienten.
+
+    """
+    figure = Figure(figsize=(10, 6))
+    axes = figure.subplots()
+
+    axes.scatter(x, y, label=label, color=color, alpha=0.6)
+    # Eine Gerade genügt mit ihren beiden Endpunkten
+    line_x = np.array([x.min(), x.max()])
+    axes.plot(line_x, slope * line_x + intercept, color='black', linestyle='-', linewidth=2, label='Regressionslinie')
+
+    axes.set_xlabel(xlabel)
+    axes.set_ylabel(ylabel)
+    axes.set_title(title)
+    axes.text(0.05, 0.95, annotation, fontsize=10, transform=axes.transAxes,
+              verticalalignment='top', bbox=dict(boxstyle="round", alpha=0.5, facecolor="white"))
+
+    axes.legend()
+    axes.grid(True)
+
+    figure.tight_layout()
+    figure.savefig(output_path)
+    if message:
+        print(message)
+
+def render_density_regression(output_path, density, x_edges, y_edges, label, color, slope, intercept, annotation,
+                              xlabel, ylabel, title, message=None):
+    """
+    Wie render_scatter_regression, aber mit einem vorab berechneten 2D-Histogramm (density[x, y]) statt einzelner
+    Punkte, gezeichnet als Bild in der Parteifarbe mit logarithmischer Farbskala. Aufwand und Dateigröße hängen
+    nur von der Rastergröße ab, nicht von der Anzahl der Posts.
+
+    """
+    figure = Figure(figsize=(10, 6))
+    axes = figure.subplots()
+
+    # Schon eine einzelne Post-Zelle erhält eine helle Tönung der Parteifarbe, nur leere Zellen bleiben weiß
+    light_color = tuple(0.8 + 0.2 * channel for channel in color)
+    colormap = LinearSegmentedColormap.from_list(label, [light_color, color])
+    extent = (x_edges[0], x_edges[-1], y_edges[0], y_edges[-1])
+    # Leere Zellen bleiben weiß
+    image = axes.imshow(np.ma.masked_equal(density.T, 0), origin='lower', aspect='auto', extent=extent,
+                        cmap=colormap, norm=LogNorm(vmin=1, vmax=max(density.max(), 2)), interpolation='nearest')
+    figure.colorbar(image, ax=axes, label='Anzahl Posts')
+
+    line_x = np.array([x_edges[0], x_edges[-1]])
+    # Weiße Kontur, damit die Linie auch über dunklen Parteifarben sichtbar bleibt
+    line, = axes.plot(line_x, slope * line_x + intercept, color='black', linestyle='-', linewidth=2, label='Regressionslinie',
+                      path_effects=[patheffects.withStroke(linewidth=4, foreground='white')])
+    axes.set_xlim(extent[0], extent[1])
+    axes.set_ylim(extent[2], extent[3])
+
+    axes.set_xlabel(xlabel)
+    axes.set_ylabel(ylabel)
+    axes.set_title(title)
+    axes.text(0.05, 0.95, annotation, fontsize=10, transform=axes.transAxes,
+              verticalalignment='top', bbox=dict(boxstyle="round", alpha=0.5, facecolor="white"))
+
+    axes.legend(handles=[Patch(color=color, label=label), line])
+    axes.grid(True)
+
+    figure.tight_layout()
+    figure.savefig(output_path)
+    if message:
+        print(message)
+
+def density_grid(x, y, bins=DENSITY_BINS):
+    """
+    2D-Histogramm mit gleich breiten Klassen zwischen Minimum und Maximum, wie np.histogram2d, aber über
+    direkt berechnete Klassenindizes und ein einziges bincount statt einer Suche pro Punkt.
+
+    """
+    edges = []
+    indices = []
+    for values in (x, y):
+        low, high = (float(values.min()), float(values.max())) if len(values) else (0.0, 1.0)
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+        edges.append(np.linspace(low, high, bins + 1))
+        # Der Maximalwert gehört wie bei np.histogram2d in die letzte Klasse
+        indices.append(np.minimum(((values - low) * (bins / (high - low))).astype(np.int64), bins - 1))
+    density = np.bincount(indices[0] * bins + indices[1], minlength=bins * bins).reshape(bins, bins)
+    return density, edges[0], edges[1]
+
+def render_engagement_plot(render_pool, plot_mode, output_path, x, y, label, color, slope, intercept, annotation,
+                           xlabel, ylabel, title, message=None, bins=DENSITY_BINS):
+    """
+    Zeichnet ein Engagement-Diagramm als Streudiagramm oder als Dichteraster (plot_mode, siehe PLOT_MODES).
+    Das Raster wird im aufrufenden Prozess vektorisiert gezählt, an den RenderPool geht nur das kleine Histogramm.
+
+    """
+    if plot_mode not in PLOT_MODES:
+        raise ValueError(f"Unbekannter Darstellungsmodus: {plot_mode} (erlaubt: {', '.join(PLOT_MODES)})")
+
+    if plot_mode == "density" or (plot_mode == "auto" and len(x) > DENSITY_THRESHOLD):
+        density, x_edges, y_edges = density_grid(x, y, bins)
+        render(render_pool, render_density_regression, output_path, density, x_edges, y_edges, label, color,
+               slope, intercept, annotation, xlabel, ylabel, title, message)
+    else:
+        render(render_pool, render_scatter_regression, output_path, x, y, label, color, slope, intercept,
+               annotation, xlabel, ylabel, title, message)
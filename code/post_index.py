@@ -0,0 +1,193 @@
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+
+# Datenbank im Profilordner: Metadaten (01_instadownload.py) und Post-Index (01 und 02)
+METADATA_DATABASE = "metadata.sqlite"
+
+# Dateiname im Format JJJJ-MM-TT_HH-MM-SS_UTC[_Slide].jpg
+FILENAME_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2})_(\d{2}-\d{2}-\d{2})(.*?)(?:_(\d+))?\.jpg$')
+
+STATUS_DOWNLOADED = "heruntergeladen"
+STATUS_PROCESSED = "verarbeitet"
+# Im Index bekannt, aber nicht mehr im jpg-Ordner vorhanden
+STATUS_MISSING = "fehlt"
+
+# Art eines endgültig fehlgeschlagenen Downloads
+FAILED_POST = "bild"
+FAILED_METADATA = "metadaten"
+
+# Gröbste übliche Auflösung der Änderungszeit (FAT: 2 Sekunden)
+MTIME_RESOLUTION_NS = 2_000_000_000
+
+def connect(profile_folder):
+    connection = sqlite3.connect(os.path.join(profile_folder, METADATA_DATABASE))
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS images ("
+        "filename TEXT PRIMARY KEY, post TEXT, shortcode TEXT, date_utc TEXT, "
+        "slideshow INTEGER, slide INTEGER, jpg_path TEXT, json_path TEXT, status TEXT)"
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS images_date_utc ON images (date_utc)")
+    connection.execute("CREATE INDEX IF NOT EXISTS images_status ON images (status)")
+    # Änderungszeit des jpg-Ordners beim letzten Abgleich mit dem Index
+    connection.execute("CREATE TABLE IF NOT EXISTS folders (path TEXT PRIMARY KEY, mtime_ns INTEGER)")
+    # Endgültig fehlgeschlagene Downloads, die beim nächsten Lauf erneut versucht werden
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS failed_posts ("
+        "shortcode TEXT PRIMARY KEY, date_utc TEXT, kind TEXT, error TEXT, attempts INTEGER)"
+    )
+    return connection
+
+def parse_image_filename(filename):
+    """
+    Zerlegt einen Bilddateinamen in Post-Name, UTC-Zeitstempel und Karussell-Position.
+    Gibt None zurück, wenn der Name nicht dem Instaloader-Schema entspricht.
+
+    """
+    match = FILENAME_PATTERN.match(filename)
+    if not match:
+        return None
+    date, time, suffix, slide = match.groups()
+    try:
+        date_utc = datetime.strptime(f"{date}_{time}", "%Y-%m-%d_%H-%M-%S")
+    except ValueError:
+        return None
+    return {
+        "post": f"{date}_{time}{suffix}",
+        "date_utc": date_utc.isoformat(),
+        "slideshow": 1 if slide else 0,
+        "slide": int(slide) if slide else 1,
+    }
+
+def register_images(profile_folder, filenames, shortcodes=None, with_json=True):
+    # Neue Bilder mit Status "heruntergeladen" in den Index schreiben
+    shortcodes = shortcodes or {}
+    rows = []
+    for filename in filenames:
+        fields = parse_image_filename(filename)
+        if fields is None:
+            continue
+        json_path = os.path.join("json", fields["post"] + ".json") if with_json else None
+        rows.append((
+            filename, fields["post"], shortcodes.get(fields["post"]), fields["date_utc"],
+            fields["slideshow"], fields["slide"], os.path.join("jpg", filename), json_path, STATUS_DOWNLOADED,
+        ))
+
+    connection = connect(profile_folder)
+    with connection:
+        connection.executemany(
+            "INSERT INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(filename) DO UPDATE SET shortcode = COALESCE(excluded.shortcode, images.shortcode), "
+            "json_path = COALESCE(excluded.json_path, images.json_path), status = excluded.status",
+            rows,
+        )
+    connection.close()
+    return len(rows)
+
+def ensure_index(profile_folder):
+    """
+    Gleicht den Index mit dem jpg-Ordner ab, sobald sich dessen Änderungszeit seit dem letzten Abgleich geändert hat
+    (Dateien hinzugefügt, gelöscht oder umbenannt). Bestehende Archive ohne Index werden dabei vollständig übernommen,
+    Bilder, die nicht vom Downloader stammen, nachgetragen und gelöschte Bilder als "fehlt" markiert.
+
+    """
+    jpg_folder = os.path.join(profile_folder, "jpg")
+    if not os.path.isdir(jpg_folder):
+        return
+    mtime_ns = os.stat(jpg_folder).st_mtime_ns
+
+    connection = connect(profile_folder)
+    stored = connection.execute("SELECT mtime_ns FROM folders WHERE path = 'jpg'").fetchone()
+    if stored is not None and stored[0] == mtime_ns:
+        connection.close()
+        return
+    indexed = dict(connection.execute("SELECT filename, status FROM images").fetchall())
+    connection.close()
+
+    on_disk = {filename for filename in os.listdir(jpg_folder) if filename.endswith(".jpg")}
+    # Neue oder wieder aufgetauchte Bilder müssen (erneut) verarbeitet werden
+    added = [filename for filename in sorted(on_disk)
+             if filename not in indexed or indexed[filename] == STATUS_MISSING]
+    removed = [filename for filename, status in indexed.items()
+               if filename not in on_disk and status != STATUS_MISSING]
+    if added:
+        with_json = os.path.isdir(os.path.join(profile_folder, "json"))
+        register_images(profile_folder, added, with_json=with_json)
+    # Änderungen kurz nach dem Auflisten können innerhalb der Zeitauflösung dieselbe Änderungszeit tragen;
+    # solange die letzte Änderung so frisch ist, wird sie nicht gespeichert und beim nächsten Aufruf erneut abgeglichen
+    if time.time_ns() - mtime_ns <= MTIME_RESOLUTION_NS:
+        mtime_ns = None
+
+    connection = connect(profile_folder)
+    with connection:
+        connection.executemany("UPDATE images SET status = ? WHERE filename = ?",
+                               [(STATUS_MISSING, filename) for filename in removed])
+        connection.execute("INSERT OR REPLACE INTO folders VALUES ('jpg', ?)", (mtime_ns,))
+    connection.close()
+
+def last_image_datetime(profile_folder):
+    ensure_index(profile_folder)
+    connection = connect(profile_folder)
+    latest = connection.execute("SELECT MAX(date_utc) FROM images").fetchone()[0]
+    connection.close()
+    return datetime.fromisoformat(latest) if latest else None
+
+def list_images(profile_folder, status=None):
+    """
+    Liefert die Bilder eines Profils als (Dateiname, Datum, Uhrzeit, Slideshow, Slide), sortiert nach Dateiname,
+    optional nur mit einem bestimmten Verarbeitungsstatus. Als fehlend markierte Bilder werden übersprungen.
+
+    """
+    ensure_index(profile_folder)
+    connection = connect(profile_folder)
+    query = "SELECT filename, date_utc, slideshow, slide FROM images"
+    if status is not None:
+        query += " WHERE status = ?"
+        parameters = (status,)
+    else:
+        query += " WHERE status != ?"
+        parameters = (STATUS_MISSING,)
+    rows = connection.execute(query + " ORDER BY filename", parameters).fetchall()
+    connection.close()
+
+    images = []
+    for filename, date_utc, slideshow, slide in rows:
+        date_utc = datetime.fromisoformat(date_utc)
+        images.append((filename, date_utc.strftime("%Y-%m-%d"), date_utc.strftime("%H-%M-%S"), slideshow, slide))
+    return images
+
+def mark_processed(profile_folder, filenames):
+    connection = connect(profile_folder)
+    with connection:
+        connection.executemany(
+            "UPDATE images SET status = ? WHERE filename = ?",
+            [(STATUS_PROCESSED, filename) for filename in filenames],
+        )
+    connection.close()
+
+def record_failed_posts(profile_folder, failures):
+    # failures: (Shortcode, UTC-Zeitpunkt, Art, Fehlermeldung); erneute Fehlschläge erhöhen die Anzahl der Versuche
+    connection = connect(profile_folder)
+    with connection:
+        connection.executemany(
+            "INSERT INTO failed_posts VALUES (?, ?, ?, ?, 1) "
+            "ON CONFLICT(shortcode) DO UPDATE SET kind = excluded.kind, error = excluded.error, "
+            "attempts = failed_posts.attempts + 1",
+            [(shortcode, date_utc.isoformat(), kind, error) for shortcode, date_utc, kind, error in failures],
+        )
+    connection.close()
+
+def failed_posts(profile_folder):
+    # (Shortcode, Art) der fehlgeschlagenen Downloads, älteste zuerst
+    connection = connect(profile_folder)
+    rows = connection.execute("SELECT shortcode, kind FROM failed_posts ORDER BY date_utc").fetchall()
+    connection.close()
+    return rows
+
+def clear_failed_posts(profile_folder, shortcodes):
+    connection = connect(profile_folder)
+    with connection:
+        connection.executemany("DELETE FROM failed_posts WHERE shortcode = ?", [(shortcode,) for shortcode in shortcodes])
+    connection.close()
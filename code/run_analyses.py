@@ -0,0 +1,148 @@
+import os
+import sys
+import glob
+import json
+import hashlib
+import importlib
+
+# Die Analyse-Skripte beginnen mit einer Ziffer und werden über importlib geladen
+CODE_FOLDER = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CODE_FOLDER)
+from dataset import load_dataset, csv_identity
+from plot_rendering import RenderPool
+from instrumentation import metrics
+
+# Name: (Skript, Funktion, Unterordner im Analytics-Ordner, erwartete Ausgabedateien als Glob-Muster)
+ANALYSES = {
+    "AggregatedColorTime": ("03_AggregationColorTime", "aggregate_color_share", "01_AggregatedColorTime",
+                            ["CSV.csv", "Plot.jpg"]),
+    "AggregatedPostsTime": ("04_AggregationPostsTime", "aggregate_color_share", "02_AggregatedPostsTime",
+                            ["CSV.csv", "Plot_Anzahl.jpg", "Plot_Kumulative_Anzahl.jpg"]),
+    "LikesAndColorCutted": ("05_LikesAndColorCutted", "plot_likes_vs_color_share", "05_LikesAndColorCutted",
+                            ["*_LikesAndColor_with_regression_cutted.jpg"]),
+    "CommentsAndColorCutted": ("06_CommentsAndColorCutted", "plot_comments_vs_color_share", "06_CommentsAndColorCutted",
+                               ["*_CommentsAndColor_with_regression_cutted.jpg"]),
+    "Slideshows": ("07_Slideshows", "analyse_farbanteile", "08_Slideshows",
+                   ["CSV.csv", "Karussells.csv", "Karussell_Kennzahlen.csv", "Farbanteile_Slides.png"]),
+    "EngagementStatistics": ("engagement_stats", "engagement_statistics_report", "09_EngagementStatistics",
+                             ["CSV.csv"]),
+}
+
+# Gemeinsam genutzte Module, deren Änderung alle Analysen neu auslöst
+SHARED_MODULES = ("dataset", "plot_rendering", "engagement_stats", "aggregation_cube", "carousel_analytics")
+
+STAMP_FILE = ".analysis_stamp.json"
+
+# Mit diesen Parametern lesen die Analysen result.csv selbst (inkrementell bzw. in Chunks) statt den Datensatz zu laden
+SELF_LOADING_PARAMETERS = ("incremental", "chunksize")
+
+def source_hash(*module_names):
+    # Änderungen am Code einer Analyse sollen sie ebenfalls neu auslösen
+    digest = hashlib.sha256()
+    for module_name in module_names:
+        with open(os.path.join(CODE_FOLDER, module_name + ".py"), "rb") as source_file:
+            digest.update(source_file.read())
+    return digest.hexdigest()
+
+def analysis_stamp(input_csv_path, script, parameters):
+    return {
+        "input": csv_identity(input_csv_path),
+        "code": source_hash(script, *SHARED_MODULES),
+        "parameters": parameters,
+    }
+
+def is_up_to_date(output_folder, stamp, outputs):
+    stamp_path = os.path.join(output_folder, STAMP_FILE)
+    if not os.path.exists(stamp_path):
+        return False
+    with open(stamp_path, "r", encoding="utf-8") as stamp_file:
+        if json.load(stamp_file) != stamp:
+            return False
+    return all(glob.glob(os.path.join(output_folder, pattern)) for pattern in outputs)
+
+def output_mtimes(output_folder, outputs):
+    # Änderungszeit aller Dateien, die zu einem der Ausgabemuster passen
+    return {path: os.stat(path).st_mtime_ns
+            for pattern in outputs for path in glob.glob(os.path.join(output_folder, pattern))}
+
+def stale_outputs(output_folder, outputs, previous_mtimes):
+    """
+    Liefert die Ausgabemuster ohne passende Datei und die Dateien, die seit previous_mtimes nicht neu geschrieben wurden.
+    Die Analysen fangen ihre Fehler selbst ab, alte Ausgaben früherer Läufe dürfen daher nicht als Erfolg zählen.
+
+    """
+    missing = [pattern for pattern in outputs if not glob.glob(os.path.join(output_folder, pattern))]
+    unchanged = [path for path, mtime in output_mtimes(output_folder, outputs).items()
+                 if previous_mtimes.get(path) == mtime]
+    return missing, unchanged
+
+def run_analyses(input_csv_path, analytics_path, selection=None, force=False, parameters=None, render_workers=None):
+    """
+    Führt eine Auswahl der Analysen (03-07 und die Statistik-Tabelle) in einem Prozess aus und lädt den Datensatz dafür nur einmal.
+    Analysen, deren Eingabe, Code und Parameter sich seit dem letzten Lauf nicht geändert haben, werden übersprungen.
+    Die Abbildungen werden in einem gemeinsamen RenderPool gezeichnet, während die nächste Analyse schon rechnet.
+
+    """
+    selection = list(ANALYSES) if selection is None else selection
+    parameters = parameters or {}
+    df = None
+    pending = []
+    metrics.reset()
+
+    with RenderPool(render_workers) as render_pool:
+        for name in selection:
+            script, function_name, subfolder, outputs = ANALYSES[name]
+            output_folder = os.path.join(analytics_path, subfolder)
+            analysis_parameters = parameters.get(name, {})
+            stamp = analysis_stamp(input_csv_path, script, analysis_parameters)
+
+            if not force and is_up_to_date(output_folder, stamp, outputs):
+                print(f"{name}: unverändert, wird übersprungen.")
+                metrics.count("analysen_uebersprungen")
+                continue
+
+            os.makedirs(output_folder, exist_ok=True)
+            stamp_path = os.path.join(output_folder, STAMP_FILE)
+            if os.path.exists(stamp_path):
+                os.remove(stamp_path)
+
+            previous_mtimes = output_mtimes(output_folder, outputs)
+            analysis = getattr(importlib.import_module(script), function_name)
+            if any(analysis_parameters.get(key) for key in SELF_LOADING_PARAMETERS):
+                with metrics.timer(name):
+                    analysis(input_csv_path, output_folder, render_pool=render_pool, **analysis_parameters)
+            else:
+                if df is None:
+                    with metrics.timer("datensatz_laden"):
+                        df = load_dataset(input_csv_path)
+                with metrics.timer(name):
+                    analysis(input_csv_path, output_folder, df=df, render_pool=render_pool, **analysis_parameters)
+            pending.append((name, output_folder, stamp, outputs, previous_mtimes))
+
+        # Erst wenn alle Abbildungen fertig sind, lässt sich prüfen, ob die Ausgaben vollständig sind
+        with metrics.timer("abbildungen_abwarten"):
+            render_pool.wait()
+
+    for name, output_folder, stamp, outputs, previous_mtimes in pending:
+        # Stempel nur schreiben, wenn die Analyse alle Ausgaben in diesem Lauf tatsächlich geschrieben hat
+        missing, unchanged = stale_outputs(output_folder, outputs, previous_mtimes)
+        if not missing and not unchanged:
+            with open(os.path.join(output_folder, STAMP_FILE), "w", encoding="utf-8") as stamp_file:
+                json.dump(stamp, stamp_file, indent=2)
+        else:
+            for pattern in missing:
+                print(f"{name}: Ausgabe fehlt: {pattern}")
+            for path in unchanged:
+                print(f"{name}: Ausgabe wurde nicht neu geschrieben: {os.path.basename(path)}")
+            print(f"{name}: Die Analyse wird beim nächsten Lauf wiederholt.")
+
+    metrics.write_summary(analytics_path, "run_metrics")
+
+if __name__ == "__main__":
+    input_csv_path = r"C:\\Users\\pasol\\Pictures\\Database_CulturalAnalytics\\02_Processed\\result.csv"
+    analytics_path = r"C:\\Users\\pasol\\Pictures\\Database_CulturalAnalytics\\03_Analytics"
+
+    # Optional eine Auswahl an Analysen als Argumente, z. B. "Slideshows AggregatedColorTime"
+    selection = sys.argv[1:] or None
+
+    run_analyses(input_csv_path, analytics_path, selection)